@@ -0,0 +1,335 @@
+"""
+Rough throughput measurements for the different ways of simulating a Gate.
+
+Run with the name of a benchmark, for example:
+    python benchmarks.py parallel 4
+"""
+import multiprocessing
+import os
+from multiprocessing.pool import ThreadPool
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from gates import (TwoToOneMux, HalfAdder, OneBitAdder, ThreeWayAnd, FourToOneMux, FourBitAdder,
+                   NBitAdder, MuxTree, LatchArray, TwoToFourLineDecoder, OneToFourLineDemux,
+                   MemoizedGate, FourToTwoLineEncoder)
+from netlist import flatten, Simulator, CompiledSimulator, CompiledCircuit
+from lutmap import mapLuts
+from parallel import ParallelSimulator
+from reach import explore
+from synthesis import synthesize, countGates
+from importer import load
+
+def randomVectors(nBits, count, seed = 0):
+    rng = random.Random(seed)
+    return [tuple(rng.randint(0, 1) for i in xrange(nBits)) for j in xrange(count)]
+
+def runGate(gate, vectors):
+    """ Simulate vectors with the Gate object itself, one setIn() at a time """
+    results = []
+    for vector in vectors:
+        for pin, value in enumerate(vector):
+            gate.setIn(pin, value)
+        results.append(tuple(1 if gate.getOutPin(i).value else 0 for i in xrange(gate.nOutputs)))
+    return results
+
+def runSteps(simulator, vectors):
+    """ Simulate vectors one step() at a time """
+    return [simulator.step(vector) for vector in vectors]
+
+def runBatches(simulator, vectors):
+    return simulator.run(vectors)
+
+def timed(fn, *args):
+    """ Return fn(*args) and the seconds it took """
+    start = time.time()
+    result = fn(*args)
+    return result, time.time() - start
+
+def report(label, nVectors, seconds):
+    print "  %-28s %12.0f vectors/sec" % (label, nVectors / max(seconds, 1e-9))
+
+def benchParallel(maxProcesses = None, nVectors = 2048):
+    """ Scaling of the ParallelSimulator from 1 to maxProcesses processes """
+    maxProcesses = maxProcesses or multiprocessing.cpu_count()
+    for gate in [NBitAdder(32), MuxTree(7)]:
+        netlist = flatten(gate)
+        vectors = randomVectors(netlist.nInputs, nVectors)
+        print "%s (%s cpus)" % (netlist, multiprocessing.cpu_count())
+
+        expected, seconds = timed(runGate, gate, vectors[:nVectors // 8])
+        report("Gate objects", nVectors // 8, seconds)
+        expected, seconds = timed(Simulator(netlist).run, vectors)
+        report("Simulator", nVectors, seconds)
+        for n in xrange(1, maxProcesses + 1):
+            with ParallelSimulator(netlist, n) as sim:
+                results, seconds = timed(sim.run, vectors)
+                report("%s process(es) %s cut=%s" % (n, sim.partitioning.sizes, sim.partitioning.cutNets), nVectors, seconds)
+            if results != expected:
+                print "  MISMATCH with %s processes" % n
+
+def benchLut(k = 4, nVectors = 2000):
+    """
+    Size, depth and speed of LUT-mapped netlists. The speedups compare a CompiledSimulator
+    running the LUTs with the Gate objects, and with a CompiledSimulator running the
+    gate-level netlist (stepping one vector at a time, and in batches).
+    """
+    print "%-14s %12s %12s %10s %10s %10s" % ("", "cells/depth", "LUTs/depth", "vs Gate", "vs step", "vs batch")
+    for gate in [TwoToOneMux(), HalfAdder(), OneBitAdder(), ThreeWayAnd(), FourToOneMux(),
+                 FourBitAdder(), NBitAdder(32), MuxTree(6)]:
+        netlist = flatten(gate)
+        mapped = mapLuts(netlist, k)
+        vectors = randomVectors(netlist.nInputs, nVectors)
+        expected = Simulator(netlist).run(vectors)
+
+        # the Gate objects are slow, so they only get a few vectors
+        few = vectors[:nVectors // 20]
+        gateResults, gateSeconds = timed(runGate, gate, few)
+        lutResults, lutSeconds = timed(runSteps, CompiledSimulator(mapped), few)
+        speedups = [gateSeconds / max(lutSeconds, 1e-9)]
+        for run in [runSteps, runBatches]:
+            cellResults, cellSeconds = timed(run, CompiledSimulator(netlist), vectors)
+            lutResults, lutSeconds = timed(run, CompiledSimulator(mapped), vectors)
+            if cellResults != expected or lutResults != expected:
+                print "  MISMATCH for %s" % netlist.name
+            speedups.append(cellSeconds / max(lutSeconds, 1e-9))
+
+        print "%-14s %12s %12s %9.1fx %9.2fx %9.2fx" % (netlist.name,
+            "%s/%s" % (len(netlist.cells), netlist.depth), "%s/%s" % (len(mapped.cells), mapped.depth),
+            speedups[0], speedups[1], speedups[2])
+
+def benchReach(maxLatches = 16):
+    """
+    Reachable state-space exploration of LatchArrays. The alphabet sets one latch to 0 or 1
+    per vector, so a LatchArray(n) reaches all 2**n states in n steps.
+    """
+    print "%-14s %10s %8s %14s %18s" % ("", "states", "depth", "transitions", "transitions/sec")
+    for n in xrange(4, maxLatches + 1, 4):
+        netlist = flatten(LatchArray(n))
+        alphabet = []
+        for i in xrange(n):
+            for value in (0, 1):
+                vector = [0] * (2 * n)
+                vector[2 * i] = value
+                vector[2 * i + 1] = 1
+                alphabet.append(tuple(vector))
+        space = explore(netlist, alphabet)
+        if space.nStates != 1 << n or space.depth != n:
+            print "  WRONG state space for %s latches" % n
+        print "%-14s %10s %8s %14s %18.0f" % ("LatchArray(%s)" % n, space.nStates, space.depth,
+                                               space.transitions, space.rate)
+
+def benchMemo(nPatterns = 8, nVectors = 5000):
+    """
+    Memoized gates driven with a few recurring input patterns, for a range of cache
+    capacities. Setting a vector one pin at a time also looks up the partial vectors.
+    """
+    print "%-22s %9s %9s %9s %10s %9s" % ("", "capacity", "hit rate", "evictions", "vectors/s", "speedup")
+    for make in [TwoToFourLineDecoder, OneToFourLineDemux, FourToOneMux, FourBitAdder]:
+        gate = make()
+        patterns = randomVectors(gate.nInputs, nPatterns)
+        rng = random.Random(1)
+        vectors = [rng.choice(patterns) for i in xrange(nVectors)]
+        expected = Simulator(flatten(make())).run(vectors)
+        results, seconds = timed(runGate, gate, vectors)
+        print "%-22s %9s %9s %9s %10.0f" % (gate.__class__.__name__, "-", "-", "-", nVectors / max(seconds, 1e-9))
+        for capacity in [4, 16, 64]:
+            memo = MemoizedGate(make(), capacity)
+            results, memoSeconds = timed(runGate, memo, vectors)
+            if results != expected:
+                print "  MISMATCH for capacity %s" % capacity
+            print "%-22s %9s %9.2f %9s %10.0f %8.1fx" % ("", capacity, memo.hitRate, memo.evictions,
+                nVectors / max(memoSeconds, 1e-9), seconds / max(memoSeconds, 1e-9))
+
+def _startOnce(directory, name, args):
+    """
+    Get a CompiledSimulator from the cache in a new process.
+    Returns the seconds spent importing, getting the simulator, and running the whole process.
+    """
+    script = ("import time; start = time.time(); "
+              "import gates; from circuitcache import CircuitCache; imported = time.time(); "
+              "CircuitCache(%r).simulator(gates.%s, %r); "
+              "print imported - start, time.time() - imported" % (directory, name, tuple(args)))
+    start = time.time()
+    output = subprocess.check_output([sys.executable, '-c', script])
+    imports, seconds = [float(t) for t in output.split()]
+    return imports, seconds, time.time() - start
+
+def benchCache(nRuns = 3):
+    """
+    Cold and warm starts with a CircuitCache, each in a fresh process: cold builds, flattens and
+    compiles the gate, warm loads it from the cache. The times are the best of nRuns: the
+    imports, getting the CompiledSimulator, and the whole process.
+    """
+    print "%-16s %9s %10s %10s %9s %13s %13s" % ("", "imports", "cold", "warm", "speedup", "cold process", "warm process")
+    for name, args in [('FourBitAdder', ()), ('NBitAdder', (32,)), ('NBitAdder', (128,)), ('MuxTree', (8,))]:
+        directory = tempfile.mkdtemp()
+        try:
+            cold = []
+            warm = []
+            for run in xrange(nRuns):
+                shutil.rmtree(directory)
+                cold.append(_startOnce(directory, name, args))
+                warm.append(_startOnce(directory, name, args))
+        finally:
+            shutil.rmtree(directory, True)
+        best = lambda runs, i: min(run[i] for run in runs) * 1000
+        print "%-16s %7.1fms %8.1fms %8.1fms %8.1fx %11.1fms %11.1fms" % ("%s%s" % (name, args or ""),
+            best(cold + warm, 0), best(cold, 1), best(warm, 1), best(cold, 1) / max(best(warm, 1), 1e-6),
+            best(cold, 2), best(warm, 2))
+
+def benchThreads(maxThreads = 8, nVectors = 32768, nTasks = 32):
+    """
+    Throughput of one shared CompiledCircuit against the number of threads. Each task runs a
+    slice of the vectors in its own Context. On a CPython with a global interpreter lock the
+    threads take turns, so this only scales on an interpreter without one.
+    """
+    for gate in [NBitAdder(32), MuxTree(7)]:
+        circuit = CompiledCircuit(flatten(gate))
+        vectors = randomVectors(circuit.nInputs, nVectors)
+        size = (nVectors + nTasks - 1) // nTasks
+        tasks = [vectors[start:start + size] for start in xrange(0, nVectors, size)]
+        expected = Simulator(circuit.netlist).run(vectors)
+        print "%s (%s cpus)" % (circuit, multiprocessing.cpu_count())
+
+        def task(chunk):
+            return circuit.newContext().run(chunk)
+
+        baseline = None
+        for n in xrange(1, maxThreads + 1):
+            pool = ThreadPool(n)
+            try:
+                chunks, seconds = timed(pool.map, task, tasks)
+            finally:
+                pool.close()
+                pool.join()
+            if sum(chunks, []) != expected:
+                print "  MISMATCH with %s threads" % n
+            baseline = baseline or seconds
+            print "  %2s thread(s) %14.0f vectors/sec %6.2fx" % (n, nVectors / max(seconds, 1e-9), baseline / max(seconds, 1e-9))
+
+def truthTableOf(gate):
+    """ The truth table of a combinational gate, in the form synthesize() takes """
+    n = gate.nInputs
+    rows = [[(row >> i) & 1 for i in xrange(n)] for row in xrange(1 << n)]
+    return Simulator(flatten(gate)).run(rows)
+
+def benchSynth(nVectors = 2000):
+    """
+    Gates synthesized from the truth tables of the hand-built ones: the number of primitive
+    gates (including fans), the number of cells left after flattening, and the speed of the
+    Gate objects. Synthesis only uses And, Or and Not, so gates built around Xor get bigger.
+    """
+    print "%-22s %14s %14s %10s" % ("", "gates (synth)", "cells (synth)", "speedup")
+    for make in [TwoToOneMux, HalfAdder, OneBitAdder, FourToOneMux, TwoToFourLineDecoder,
+                 OneToFourLineDemux, FourToTwoLineEncoder, FourBitAdder]:
+        gate = make()
+        table = truthTableOf(gate)
+        synthesized = synthesize(table, gate.nInputs, make.__name__)()
+        if truthTableOf(synthesized) != table:
+            print "  MISMATCH for %s" % make.__name__
+        vectors = randomVectors(gate.nInputs, nVectors)
+        handResults, handSeconds = timed(runGate, gate, vectors)
+        synthResults, synthSeconds = timed(runGate, synthesized, vectors)
+        print "%-22s %14s %14s %9.2fx" % (make.__name__,
+            "%s (%s)" % (sum(countGates(gate).values()), sum(countGates(synthesized).values())),
+            "%s (%s)" % (len(flatten(gate).cells), len(flatten(synthesized).cells)),
+            handSeconds / max(synthSeconds, 1e-9))
+
+IMPORT_GATES = ['and', 'or', 'xor', 'nand', 'nor', 'xnor', 'not']
+
+def writeRandomDesign(blifPath, verilogPath, nGates, nInputs = 64, window = 256, seed = 0):
+    """
+    Write the same random design of nGates gates as BLIF and as structural Verilog. Each gate
+    reads nets from the last window nets made, and nets nothing reads become outputs.
+    """
+    rng = random.Random(seed)
+    used = bytearray(nInputs + nGates)
+    covers = {
+        'and': lambda k: ['1' * k + ' 1'],
+        'or': lambda k: ['-' * j + '1' + '-' * (k - j - 1) + ' 1' for j in xrange(k)],
+        'nand': lambda k: ['-' * j + '0' + '-' * (k - j - 1) + ' 1' for j in xrange(k)],
+        'nor': lambda k: ['0' * k + ' 1'],
+        'xor': lambda k: ['10 1', '01 1'],
+        'xnor': lambda k: ['00 1', '11 1'],
+        'not': lambda k: ['0 1'],
+    }
+    with open(blifPath, 'w') as blif, open(verilogPath, 'w') as verilog:
+        inputs = " ".join("n%s" % i for i in xrange(nInputs))
+        blif.write(".model random\n.inputs %s\n" % inputs)
+        verilog.write("module random(%s, y);\n  input %s;\n" % (inputs.replace(" ", ", "), inputs.replace(" ", ", ")))
+        for net in xrange(nInputs, nInputs + nGates):
+            kind = rng.choice(IMPORT_GATES)
+            k = 1 if kind == 'not' else 2 if kind in ('xor', 'xnor') else rng.choice((2, 2, 3))
+            ins = [rng.randrange(max(0, net - window), net) for _ in xrange(k)]
+            for i in ins:
+                used[i] = 1
+            names = ["n%s" % i for i in ins]
+            blif.write(".names %s n%s\n%s\n" % (" ".join(names), net, "\n".join(covers[kind](k))))
+            verilog.write("  %s g%s(n%s, %s);\n" % (kind, net, net, ", ".join(names)))
+        outputs = ["n%s" % net for net in xrange(nInputs, nInputs + nGates) if not used[net]]
+        blif.write(".outputs %s\n.end\n" % " ".join(outputs))
+        verilog.write("  output [%s:0] y;\n" % (len(outputs) - 1))
+        for i, net in enumerate(outputs):
+            verilog.write("  assign y[%s] = %s;\n" % (i, net))
+        verilog.write("endmodule\n")
+
+def _importOnce(path):
+    """
+    Import a file in a new process.
+    Returns the seconds taken, the number of cells and the peak memory (KB) grown by importing.
+    """
+    script = ("import resource; from importer import load; import time; "
+              "before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss; start = time.time(); "
+              "netlist = load(%r); seconds = time.time() - start; "
+              "print seconds, len(netlist.cells), resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before" % path)
+    seconds, nCells, kilobytes = subprocess.check_output([sys.executable, '-c', script]).split()
+    return float(seconds), int(nCells), int(kilobytes)
+
+def benchImport(nGates = 100000, nVectors = 64):
+    """
+    Parse throughput of importer.py on random designs of 1000 up to nGates gates, written as
+    BLIF and as Verilog, each imported in a fresh process: gates and megabytes per second,
+    and how much the peak memory grew per gate. Then checks that both imports agree.
+    """
+    print "%-8s %9s %8s %13s %9s %12s" % ("", "gates", "cells", "gates/sec", "MB/sec", "bytes/gate")
+    directory = tempfile.mkdtemp()
+    try:
+        size = 1000
+        while size <= nGates:
+            blifPath = os.path.join(directory, 'random.blif')
+            verilogPath = os.path.join(directory, 'random.v')
+            writeRandomDesign(blifPath, verilogPath, size)
+            for label, path in [('blif', blifPath), ('verilog', verilogPath)]:
+                seconds, nCells, kilobytes = _importOnce(path)
+                print "%-8s %9s %8s %13.0f %9.2f %12.0f" % (label, size, nCells, size / seconds,
+                    os.path.getsize(path) / seconds / 1e6, kilobytes * 1024.0 / size)
+            size *= 10
+        fromBlif = load(blifPath)
+        fromVerilog = load(verilogPath)
+        vectors = randomVectors(fromBlif.nInputs, nVectors)
+        if CompiledSimulator(fromBlif).run(vectors) != CompiledSimulator(fromVerilog).run(vectors):
+            print "  MISMATCH between the BLIF and Verilog imports"
+    finally:
+        shutil.rmtree(directory, True)
+
+BENCHMARKS = {
+    'parallel': benchParallel,
+    'lut': benchLut,
+    'reach': benchReach,
+    'memo': benchMemo,
+    'cache': benchCache,
+    'threads': benchThreads,
+    'synth': benchSynth,
+    'import': benchImport,
+}
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        print "usage: python benchmarks.py {%s} [args...]" % ",".join(sorted(BENCHMARKS))
+        sys.exit(2)
+    BENCHMARKS[sys.argv[1]](*[int(arg) for arg in sys.argv[2:]])
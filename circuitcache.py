@@ -0,0 +1,258 @@
+"""
+An on-disk cache of compiled circuits, so that a process which needs a CompiledSimulator for
+a FourBitAdder doesn't have to build the Gate objects, flatten them and generate code again.
+
+A CircuitCache lives in a directory with two kinds of file:
+    - <hash>.circuit, where hash is the structural hash of a netlist (see structuralHash()):
+      the pickled Netlist (cells in levelized order, levels and any LUT truth tables) and
+      the compiled code of its generated evaluate functions
+    - <key>.key, where key is a hash of a gate class's definition (see classDefinition()),
+      its constructor arguments, the LUT size it was mapped to, and the source of the
+      modules involved: it holds the structural hash of the netlist that gate compiles to,
+      and the gate's name
+
+Editing gates.py (or netlist.py or lutmap.py) changes every key, so stale entries are never
+found again; they are evicted along with everything else once the cache is over its size
+limit, least recently used first.
+
+Files are written to a temporary name and renamed into place, which is atomic, so several
+processes can share a cache: readers see a whole file or none, and when two writers race the
+second simply replaces the first's (identical) file. Unreadable files count as misses.
+"""
+import cPickle as pickle
+import hashlib
+import inspect
+import marshal
+import os
+import sys
+import tempfile
+
+import gates
+import lutmap
+import netlist as netlistModule
+from netlist import CompiledSimulator, CompiledCircuit, compileCodes, flatten
+from lutmap import mapLuts
+
+# bump this when the format of the cache files changes
+CACHE_VERSION = 1
+
+CIRCUIT_SUFFIX = '.circuit'
+KEY_SUFFIX = '.key'
+
+def structuralHash(netlist):
+    """ A hash of a netlist's structure: its nets and cells, but not its name """
+    digest = hashlib.sha1()
+    digest.update(repr((netlist.nNets, list(netlist.inputs), list(netlist.outputs),
+                        list(netlist.cells), list(netlist.levels), list(netlist.latchInit))))
+    return digest.hexdigest()
+
+def defaultDirectory():
+    """ $GATES_CACHE, or ~/.cache/gates """
+    return os.environ.get('GATES_CACHE') or os.path.join(os.path.expanduser('~'), '.cache', 'gates')
+
+_sourceHashes = {}
+
+def _sourceHash(module):
+    """ A hash of the source file of a module (None if it has none, like python -c) """
+    try:
+        path = inspect.getsourcefile(module)
+    except TypeError:
+        return None
+    if path is None:
+        return None
+    if path not in _sourceHashes:
+        with open(path, 'rb') as f:
+            _sourceHashes[path] = hashlib.sha1(f.read()).hexdigest()
+    return _sourceHashes[path]
+
+def classDefinition(cls):
+    """
+    What a gate class is made of: for the class and each class it inherits from, the hash
+    of the source file defining it (which holds its source), or for a synthesized gate (see
+    synthesis.py) its wiring. None if a class in the way has no source of its own, like
+    one built at runtime: looking it up by name may find another class.
+    """
+    definition = []
+    for klass in cls.__mro__:
+        if klass is object:
+            continue
+        if 'WIRING' in vars(klass):
+            definition.append((klass.__name__, klass.N_INPUTS, klass.N_OUTPUTS, klass.WIRING))
+            continue
+        module = sys.modules.get(klass.__module__)
+        if getattr(module, klass.__name__, None) is not klass:
+            return None
+        source = _sourceHash(module)
+        if source is None:
+            return None
+        definition.append((klass.__module__, klass.__name__, source))
+    return definition
+
+class CircuitCache(object):
+    """
+    A directory of compiled circuits, at most maxBytes in total.
+    hits and misses count the lookups made through this object.
+    """
+    def __init__(self, directory = None, maxBytes = 64 * 1024 * 1024):
+        self.directory = directory or defaultDirectory()
+        self.maxBytes = maxBytes
+        self.hits = 0
+        self.misses = 0
+        if not os.path.isdir(self.directory):
+            try:
+                os.makedirs(self.directory)
+            except OSError:
+                # another process may have made it first
+                if not os.path.isdir(self.directory):
+                    raise
+
+    def key(self, cls, args = (), lutInputs = None):
+        """
+        The key for a gate class and its constructor arguments. A class without a definition
+        to hash is flattened, and the key uses the structural hash of its netlist instead.
+        """
+        modules = [gates, netlistModule, lutmap, sys.modules[cls.__module__]]
+        sources = sorted(set(_sourceHash(module) for module in modules))
+        definition = classDefinition(cls)
+        if definition is None:
+            definition = structuralHash(flatten(cls(*args)))
+        digest = hashlib.sha1()
+        digest.update(repr((CACHE_VERSION, sys.version, cls.__module__, cls.__name__,
+                            definition, tuple(args), lutInputs, sources)))
+        return digest.hexdigest()
+
+    def _path(self, name, suffix):
+        return os.path.join(self.directory, name + suffix)
+
+    def _read(self, path):
+        """ The contents of a file (marking it as recently used), or None """
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path, None)
+            return data
+        except (IOError, OSError):
+            return None
+
+    def _write(self, path, data):
+        """ Write a file atomically: to a temporary file which is then renamed into place """
+        fd, temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.rename(temporary, path)
+        except:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+
+    def load(self, cls, args = (), lutInputs = None):
+        """ The cached (netlist, codes) for a gate, or None """
+        key = self.key(cls, args, lutInputs)
+        data = self._read(self._path(key, KEY_SUFFIX))
+        if data is None:
+            return None
+        try:
+            circuitHash, name = data.split(None, 1)
+        except ValueError:
+            return None
+        data = self._read(self._path(circuitHash, CIRCUIT_SUFFIX))
+        if data is None:
+            return None
+        try:
+            entry = pickle.loads(data)
+            if entry['version'] != CACHE_VERSION:
+                return None
+            netlist = entry['netlist']
+            codes = dict((mode, marshal.loads(code)) for mode, code in entry['codes'].items())
+        except Exception:
+            # a file from another version of Python, or one that was damaged
+            return None
+        netlist.name = name
+        return netlist, codes
+
+    def store(self, cls, args, lutInputs, netlist, codes):
+        """ Add a compiled circuit to the cache, then evict entries if it's too big """
+        circuitHash = structuralHash(netlist)
+        # always (re)written, in case the file there is damaged
+        entry = {
+            'version': CACHE_VERSION,
+            'netlist': netlist,
+            'codes': dict((mode, marshal.dumps(code)) for mode, code in codes.items()),
+        }
+        self._write(self._path(circuitHash, CIRCUIT_SUFFIX), pickle.dumps(entry, pickle.HIGHEST_PROTOCOL))
+        key = self.key(cls, args, lutInputs)
+        self._write(self._path(key, KEY_SUFFIX), "%s %s" % (circuitHash, netlist.name))
+        self.evict()
+
+    def compiled(self, cls, args = (), lutInputs = None):
+        """
+        The netlist and compiled code for a gate class constructed with args (and mapped onto
+        LUTs with lutInputs inputs, if given), from the cache if possible.
+        """
+        entry = self.load(cls, args, lutInputs)
+        if entry is not None:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        netlist = flatten(cls(*args))
+        if lutInputs:
+            netlist = mapLuts(netlist, lutInputs)
+        codes = compileCodes(netlist)
+        self.store(cls, args, lutInputs, netlist, codes)
+        return netlist, codes
+
+    def simulator(self, cls, args = (), lutInputs = None, batchSize = 1024):
+        """ A CompiledSimulator for a gate class constructed with args """
+        netlist, codes = self.compiled(cls, args, lutInputs)
+        return CompiledSimulator(netlist, batchSize, codes)
+
+    def circuit(self, cls, args = (), lutInputs = None):
+        """ A CompiledCircuit for a gate class constructed with args, which threads can share """
+        netlist, codes = self.compiled(cls, args, lutInputs)
+        return CompiledCircuit(netlist, codes)
+
+    def files(self):
+        """ (last used, size, path) of every file in the cache """
+        files = []
+        for name in os.listdir(self.directory):
+            if not (name.endswith(CIRCUIT_SUFFIX) or name.endswith(KEY_SUFFIX)):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                info = os.stat(path)
+            except OSError:
+                continue
+            files.append((max(info.st_atime, info.st_mtime), info.st_size, path))
+        return files
+
+    @property
+    def size(self):
+        return sum(size for used, size, path in self.files())
+
+    def evict(self):
+        """ Remove the least recently used files until the cache fits in maxBytes """
+        files = sorted(self.files())
+        total = sum(size for used, size, path in files)
+        for used, size, path in files:
+            if total <= self.maxBytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                # another process got there first
+                pass
+            total -= size
+
+    def clear(self):
+        for used, size, path in self.files():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def __str__(self):
+        return "CircuitCache<%s size=%s hits=%s misses=%s>" % (self.directory, self.size, self.hits, self.misses)
+
+    def __repr__(self):
+        return str(self)
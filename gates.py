@@ -1,4 +1,5 @@
 import random
+from collections import OrderedDict
 
 # A nifty overrides decorator: http://stackoverflow.com/a/8313042
 def overrides(interface_class):
@@ -69,6 +70,55 @@ class OutputPin(Pin):
     def addConnection(self, pin):
         self.connections.add(pin)
 
+class Bus(object):
+    """
+    A Bus groups some of a gate's input or output pins into one binary number (a "word").
+    The first pin index is the least significant bit.
+    """
+    def __init__(self, name, gate, indices, isOutput):
+        self.name = name
+        self.gate = gate
+        self.indices = list(indices)
+        self.isOutput = isOutput
+
+    @property
+    def width(self):
+        return len(self.indices)
+
+    def pins(self):
+        if self.isOutput:
+            return [self.gate.getOutPin(i) for i in self.indices]
+        return [self.gate.getInPin(i) for i in self.indices]
+
+    def getBits(self):
+        """ The value of each pin as 0 or 1, least significant first """
+        return [trueFalseToOnesAndZeroes(pin.value) for pin in self.pins()]
+
+    def getWord(self):
+        word = 0
+        for i, pin in enumerate(self.pins()):
+            if pin.value:
+                word |= 1 << i
+        return word
+
+    def setWord(self, word):
+        """
+        Set every pin of an input bus at once.
+        The pin values are all updated first, then each gate which owns one of the pins
+        refreshes its outputs once (instead of once per pin).
+        """
+        if self.isOutput:
+            raise GateException("Cannot set output bus %s on this gate (%s)." % (self.name, self.gate.__class__.__name__))
+        if not 0 <= word < (1 << self.width):
+            raise GateException("%s does not fit on the %s-bit bus %s." % (word, self.width, self.name))
+        self.gate.setInputs(self.indices, [(word >> i) & 1 for i in xrange(self.width)])
+
+    def __str__(self):
+        return "%s=%s" % (self.name, list(reversed(self.getBits())))
+
+    def __repr__(self):
+        return str(self)
+
 class Gate(object):
     """ 
     This defines a base class for logic gates.
@@ -81,6 +131,7 @@ class Gate(object):
     def __init__(self, nInputs = 0, nOutputs = 0):
         self._inputs = [InputPin(self) for i in xrange(nInputs)]
         self._outputs = [OutputPin() for i in xrange(nOutputs)]
+        self._buses = {}
 
     @property
     def nInputs(self):
@@ -94,6 +145,23 @@ class Gate(object):
         """ Set the value of an input pin """
         self.getInPin(index).value = value
 
+    def setInputs(self, indices, values):
+        """
+        Set several input pins at once: pin indices[k] to values[k].
+        The pin values are all updated first, then each gate which owns one of the pins
+        refreshes its outputs once (instead of once per pin).
+        """
+        owners = []
+        seen = set()
+        for index, value in zip(indices, values):
+            pin = self.getInPin(index)
+            pin._value = bool(value)
+            if id(pin.gate) not in seen:
+                seen.add(id(pin.gate))
+                owners.append(pin.gate)
+        for gate in owners:
+            gate.refreshOutputs()
+
     def getIn(self, index):
         """ Get the value of an input pin """
         return self.getInPin(index).value
@@ -124,6 +192,29 @@ class Gate(object):
         else:
             raise GateException("No output pin %s on this gate (%s)." % (index, self.__class__.__name__))
 
+    def addInBus(self, name, indices):
+        """ Group the given input pins (least significant first) into a named Bus """
+        self._buses[name] = Bus(name, self, indices, False)
+        return self._buses[name]
+
+    def addOutBus(self, name, indices):
+        """ Group the given output pins (least significant first) into a named Bus """
+        self._buses[name] = Bus(name, self, indices, True)
+        return self._buses[name]
+
+    def bus(self, name):
+        if name in self._buses:
+            return self._buses[name]
+        raise GateException("No bus %s on this gate (%s)." % (name, self.__class__.__name__))
+
+    def setWord(self, name, word):
+        """ Set every pin of an input bus from an integer """
+        self.bus(name).setWord(word)
+
+    def getWord(self, name):
+        """ Read a bus as an integer """
+        return self.bus(name).getWord()
+
     def _setOut(self, index, value):
         if 0 <= index < len(self._outputs):
             self._outputs[index].value = value
@@ -134,6 +225,54 @@ class Gate(object):
         """ Reimplement in subclass """
         raise NotImplementedError("Don't instantiate this base class")
 
+    @property
+    def hasState(self):
+        """ Whether this gate's outputs can depend on earlier inputs, not counting the gates it is built from """
+        return False
+
+    def subGates(self):
+        """ The gates this gate is built from: any gates kept as attributes, directly or in (nested) lists """
+        stack = list(vars(self).values())
+        while stack:
+            value = stack.pop()
+            if isinstance(value, Gate):
+                yield value
+            elif isinstance(value, (list, tuple)):
+                stack.extend(value)
+
+    def allPins(self):
+        """ Every pin in this gate and in the gates it is built from, each listed once """
+        pins = []
+        seenPins = set()
+        seenGates = set()
+        stack = [self]
+        while stack:
+            gate = stack.pop()
+            if id(gate) in seenGates:
+                continue
+            seenGates.add(id(gate))
+            for pin in gate._inputs + gate._outputs:
+                if id(pin) not in seenPins:
+                    seenPins.add(id(pin))
+                    pins.append(pin)
+            stack.extend(gate.subGates())
+        return pins
+
+    def snapshot(self):
+        """
+        Capture the value of every pin in this gate, which includes the state of any latches.
+        Pass the result to restore() to return to this state.
+        """
+        return bytes(bytearray(pin._value for pin in self.allPins()))
+
+    def restore(self, snapshot):
+        """ Return to a state captured by snapshot(). Nothing is propagated. """
+        pins = self.allPins()
+        if len(snapshot) != len(pins):
+            raise GateException("Snapshot has %s pins but this gate (%s) has %s." % (len(snapshot), self.__class__.__name__, len(pins)))
+        for pin, value in zip(pins, bytearray(snapshot)):
+            pin._value = bool(value)
+
     def __str__(self):
         return "%s<In=%s Out=%s>" % (self.__class__.__name__, 
             map(lambda pin: trueFalseToOnesAndZeroes(pin.value), self._inputs),
@@ -367,6 +506,7 @@ class FourToOneMux(Gate):
         (0, 1) selects input 3
         (1, 0) selects input 4
         (1, 1) selects input 5
+    The selectors are also the bus S (so S=2 selects input 4) and the data lines are the bus D.
     """
     def __init__(self):
         super(FourToOneMux, self).__init__(6, 1)
@@ -409,6 +549,9 @@ class FourToOneMux(Gate):
 
         self.setOutPin(0, self.orGate.getOutPin(0))
 
+        self.addInBus('S', [1, 0])
+        self.addInBus('D', [2, 3, 4, 5])
+
 
 # O indicates wires do not cross
 # In0  In1
@@ -532,15 +675,91 @@ class FourBitAdder(Gate):
         self.setOutPin(3, self.oneBitAdder4.getOutPin(1))
         self.setOutPin(4, self.oneBitAdder4.getOutPin(0))
 
+        self.addInBus('A', [0, 2, 4, 6])
+        self.addInBus('B', [1, 3, 5, 7])
+        self.addInBus('C', [8])
+        self.addOutBus('OUT', range(5))
+
     def __str__(self):
         return "%s<A=%s B=%s c=%s OUT=%s>" % (
             self.__class__.__name__, 
-            map(lambda pin: trueFalseToOnesAndZeroes(pin.value), [self._inputs[i] for i in [6,4,2,0]]),
-            map(lambda pin: trueFalseToOnesAndZeroes(pin.value), [self._inputs[i] for i in [7,5,3,1]]),
-            trueFalseToOnesAndZeroes(self._inputs[8].value),
-            map(lambda pin: trueFalseToOnesAndZeroes(pin.value), reversed(self._outputs))
+            list(reversed(self.bus('A').getBits())),
+            list(reversed(self.bus('B').getBits())),
+            self.bus('C').getBits()[0],
+            list(reversed(self.bus('OUT').getBits()))
         )
 
+class NBitAdder(Gate):
+    """
+    A ripple-carry adder built from n OneBitAdders, wired like the FourBitAdder.
+    Bit i of the first operand is In(2i) and bit i of the second operand is In(2i+1).
+    In(2n) is the carry in.
+
+    Out0 through Out(n-1) are the sum bits and Out(n) is the carry out.
+    The buses A, B and C are the operands and carry, and OUT is the whole (n+1)-bit result.
+    """
+    def __init__(self, nBits):
+        if nBits < 1:
+            raise GateException("An NBitAdder needs at least one bit (got %s)." % nBits)
+        super(NBitAdder, self).__init__(2 * nBits + 1, nBits + 1)
+        self.adders = [OneBitAdder() for i in xrange(nBits)]
+
+        for i, adder in enumerate(self.adders):
+            self.setInPin(2 * i, adder.getInPin(0))
+            self.setInPin(2 * i + 1, adder.getInPin(1))
+            self.setOutPin(i, adder.getOutPin(1))
+        self.setInPin(2 * nBits, self.adders[0].getInPin(2))
+
+        for a, b in zip(self.adders, self.adders[1:]):
+            a.getOutPin(0).addConnection(b.getInPin(2))
+
+        self.setOutPin(nBits, self.adders[-1].getOutPin(0))
+
+        self.addInBus('A', range(0, 2 * nBits, 2))
+        self.addInBus('B', range(1, 2 * nBits, 2))
+        self.addInBus('C', [2 * nBits])
+        self.addOutBus('OUT', range(nBits + 1))
+
+class MuxTree(Gate):
+    """
+    A 2^n-to-one multiplexer built from a tree of TwoToOneMuxes.
+    Input pins 0 through n-1 are the selectors, most significant first (like the FourToOneMux).
+    The remaining 2^n input pins are the data lines.
+    For example, with n = 2 the selectors (1, 0) select data line 2, which is In4.
+    The selectors are also the bus S and the data lines are the bus D.
+    """
+    def __init__(self, nSelectors):
+        if nSelectors < 1:
+            raise GateException("A MuxTree needs at least one selector (got %s)." % nSelectors)
+        nData = 1 << nSelectors
+        super(MuxTree, self).__init__(nSelectors + nData, 1)
+        self.levels = []
+        self.fans = []
+        width = nData
+        for level in xrange(nSelectors):
+            width /= 2
+            muxes = [TwoToOneMux() for i in xrange(width)]
+            fan = Fan(width)
+            # the TwoToOneMux selector is its pin 0 (see the diagram above it)
+            for i, mux in enumerate(muxes):
+                fan.getOutPin(i).addConnection(mux.getInPin(0))
+                if level == 0:
+                    self.setInPin(nSelectors + 2 * i, mux.getInPin(1))
+                    self.setInPin(nSelectors + 2 * i + 1, mux.getInPin(2))
+                else:
+                    below = self.levels[-1]
+                    below[2 * i].getOutPin(0).addConnection(mux.getInPin(1))
+                    below[2 * i + 1].getOutPin(0).addConnection(mux.getInPin(2))
+            # the lowest level of the tree is switched by the least significant selector
+            self.setInPin(nSelectors - 1 - level, fan.getInPin(0))
+            self.levels.append(muxes)
+            self.fans.append(fan)
+
+        self.setOutPin(0, self.levels[-1][0].getOutPin(0))
+
+        self.addInBus('S', reversed(range(nSelectors)))
+        self.addInBus('D', range(nSelectors, nSelectors + nData))
+
 # o0 indicates the output of an internal gate
 #                o0
 # (Q) OUT0----+----NOR---In0 (reset)
@@ -576,6 +795,11 @@ class SRLatch(Gate):
         self._setOut(0, False)
         self._setOut(1, True)
 
+    @property
+    @overrides(Gate)
+    def hasState(self):
+        return True
+
     @overrides(Gate)
     def refreshOutputs(self):
         R = self.getIn(0)
@@ -663,6 +887,26 @@ class DLatch(Gate):
         self.setOutPin(0, self.gsrLatch.getOutPin(0))
         self.setOutPin(1, self.gsrLatch.getOutPin(1))
 
+class LatchArray(Gate):
+    """
+    A row of n independent DLatches.
+    In(2i) is the data line and In(2i+1) is the enable line of latch i, whose Q is Out(i).
+    The data lines are also the bus D, the enable lines the bus E and the outputs the bus Q.
+    """
+    def __init__(self, nLatches):
+        if nLatches < 1:
+            raise GateException("A LatchArray needs at least one latch (got %s)." % nLatches)
+        super(LatchArray, self).__init__(2 * nLatches, nLatches)
+        self.latches = [DLatch() for i in xrange(nLatches)]
+        for i, latch in enumerate(self.latches):
+            self.setInPin(2 * i, latch.getInPin(0))
+            self.setInPin(2 * i + 1, latch.getInPin(1))
+            self.setOutPin(i, latch.getOutPin(0))
+
+        self.addInBus('D', range(0, 2 * nLatches, 2))
+        self.addInBus('E', range(1, 2 * nLatches, 2))
+        self.addOutBus('Q', range(nLatches))
+
 # In3-------------------|
 #                       OR------OUT0
 # In2     |-------------|
@@ -733,6 +977,7 @@ class TwoToFourLineDecoder(Gate):
          0   1  -->  0    0    1    0 
          1   0  -->  0    1    0    0 
          1   1  -->  1    0    0    0 
+    The inputs are also the bus A and the outputs are the bus OUT, so A=n sets OUT to 2**n.
     """
     def __init__(self):
         super(TwoToFourLineDecoder, self).__init__(2, 4)
@@ -773,6 +1018,9 @@ class TwoToFourLineDecoder(Gate):
         self.setOutPin(2, self.and3.getOutPin(0))
         self.setOutPin(3, self.and4.getOutPin(0))
 
+        self.addInBus('A', [0, 1])
+        self.addOutBus('OUT', [0, 1, 2, 3])
+
 #              In1         In0
 #               |           |
 #               |i1         |i0
@@ -812,6 +1060,7 @@ class OneToFourLineDemux(Gate):
          1    1  --> OUT3
     When an output line is selected, all other output lines will be low.
     The data line is In2.
+    The selectors are also the bus S and the outputs are the bus OUT.
     """
     def __init__(self):
         super(OneToFourLineDemux, self).__init__(3, 4)
@@ -841,6 +1090,228 @@ class OneToFourLineDemux(Gate):
         self.setOutPin(2, self.and2.getOutPin(0))
         self.setOutPin(3, self.and3.getOutPin(0))
 
+        self.addInBus('S', [0, 1])
+        self.addOutBus('OUT', [0, 1, 2, 3])
+
+
+class WordGate(Gate):
+    """
+    A base class for word-level gates. These compute a whole bus at once with Python's integer
+    operations, like And and Or do with booleans, instead of being built out of other gates.
+    They have the same pins as the gate-level circuit they stand in for, so they can be
+    connected to other gates when the bit-level detail isn't needed.
+
+    Subclasses add their buses with addInBus() and addOutBus() and override compute(), which
+    takes one integer per input bus and returns one integer per output bus (in the order
+    the buses were added).
+    """
+    def __init__(self, nInputs, nOutputs):
+        super(WordGate, self).__init__(nInputs, nOutputs)
+        self._inBuses = []
+        self._outBuses = []
+
+    @overrides(Gate)
+    def addInBus(self, name, indices):
+        bus = super(WordGate, self).addInBus(name, indices)
+        self._inBuses.append(bus)
+        return bus
+
+    @overrides(Gate)
+    def addOutBus(self, name, indices):
+        bus = super(WordGate, self).addOutBus(name, indices)
+        self._outBuses.append(bus)
+        return bus
+
+    def compute(self, *words):
+        """ Reimplement in subclass """
+        raise NotImplementedError("Don't instantiate this base class")
+
+    @overrides(Gate)
+    def refreshOutputs(self):
+        results = self.compute(*[bus.getWord() for bus in self._inBuses])
+        for bus, word in zip(self._outBuses, results):
+            for i, index in enumerate(bus.indices):
+                self._setOut(index, (word >> i) & 1)
+
+class WordBitwise(WordGate):
+    """
+    A bitwise operation on two n-bit words.
+    In0 through In(n-1) are the bus A, In(n) through In(2n-1) are the bus B and the outputs are the bus OUT.
+    """
+    def __init__(self, nBits, op):
+        super(WordBitwise, self).__init__(2 * nBits, nBits)
+        self.op = op
+        self.addInBus('A', range(nBits))
+        self.addInBus('B', range(nBits, 2 * nBits))
+        self.addOutBus('OUT', range(nBits))
+
+    @overrides(WordGate)
+    def compute(self, a, b):
+        return [self.op(a, b)]
+
+class WordAnd(WordBitwise):
+    def __init__(self, nBits):
+        super(WordAnd, self).__init__(nBits, lambda a, b: a & b)
+
+class WordOr(WordBitwise):
+    def __init__(self, nBits):
+        super(WordOr, self).__init__(nBits, lambda a, b: a | b)
+
+class WordXor(WordBitwise):
+    def __init__(self, nBits):
+        super(WordXor, self).__init__(nBits, lambda a, b: a ^ b)
+
+class WordNot(WordGate):
+    """ Inverts an n-bit word: the inputs are the bus A and the outputs the bus OUT. """
+    def __init__(self, nBits):
+        super(WordNot, self).__init__(nBits, nBits)
+        self.mask = (1 << nBits) - 1
+        self.addInBus('A', range(nBits))
+        self.addOutBus('OUT', range(nBits))
+
+    @overrides(WordGate)
+    def compute(self, a):
+        return [~a & self.mask]
+
+class WordAdder(WordGate):
+    """ Adds two n-bit words and a carry. It has the same pins and buses as an NBitAdder. """
+    def __init__(self, nBits):
+        super(WordAdder, self).__init__(2 * nBits + 1, nBits + 1)
+        self.addInBus('A', range(0, 2 * nBits, 2))
+        self.addInBus('B', range(1, 2 * nBits, 2))
+        self.addInBus('C', [2 * nBits])
+        self.addOutBus('OUT', range(nBits + 1))
+
+    @overrides(WordGate)
+    def compute(self, a, b, c):
+        return [a + b + c]
+
+class WordMux(WordGate):
+    """
+    Selects one of two n-bit words. With one bit, it has the same pins as a TwoToOneMux.
+    In0 is the selector (the bus S), the next n pins are the bus A and the n after those
+    are the bus B. OUT is A when S is 0 and B when S is 1.
+    """
+    def __init__(self, nBits):
+        super(WordMux, self).__init__(2 * nBits + 1, nBits)
+        self.addInBus('S', [0])
+        self.addInBus('A', range(1, nBits + 1))
+        self.addInBus('B', range(nBits + 1, 2 * nBits + 1))
+        self.addOutBus('OUT', range(nBits))
+
+    @overrides(WordGate)
+    def compute(self, s, a, b):
+        if s:
+            return [b]
+        return [a]
+
+class MemoizedGate(Gate):
+    """
+    Wraps a combinational gate and remembers its outputs for recently seen inputs.
+
+    The MemoizedGate has its own pins (and the same buses as the wrapped gate). When an input
+    changes, the inputs are packed into an integer (In0 is bit 0) and looked up in a cache of
+    at most capacity entries. On a hit the outputs are set straight from the cache; on a miss
+    the inputs which changed are driven through the wrapped gate and its outputs are
+    remembered.
+
+    When the cache is full, policy decides which entry goes: LRU evicts the least recently
+    used one and FIFO the oldest. hits, misses and evictions count what happened, which
+    helps to pick a capacity.
+
+    Gates with latches are refused, since their outputs depend on more than their inputs.
+    """
+    LRU = 'lru'
+    FIFO = 'fifo'
+
+    def __init__(self, gate, capacity = 256, policy = LRU):
+        super(MemoizedGate, self).__init__(gate.nInputs, gate.nOutputs)
+        if capacity < 1:
+            raise GateException("A MemoizedGate needs room for at least one entry (got %s)." % capacity)
+        if policy not in (MemoizedGate.LRU, MemoizedGate.FIFO):
+            raise GateException("Unknown eviction policy %s." % policy)
+        if hasLatches(gate):
+            raise GateException("Cannot memoize %s: it has latches." % gate.__class__.__name__)
+        self.gate = gate
+        self.capacity = capacity
+        self.policy = policy
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # settle the wrapped gate once, so that after this a miss only has to set the pins which changed
+        self._wrappedPins = [gate.getInPin(i) for i in xrange(gate.nInputs)]
+        gate.setInputs(range(gate.nInputs), [pin._value for pin in self._wrappedPins])
+        for i in xrange(gate.nInputs):
+            self._inputs[i]._value = gate.getInPin(i).value
+        for i in xrange(gate.nOutputs):
+            self._outputs[i]._value = gate.getOutPin(i).value
+        for name, bus in gate._buses.items():
+            if bus.isOutput:
+                self.addOutBus(name, bus.indices)
+            else:
+                self.addInBus(name, bus.indices)
+
+    @property
+    def hitRate(self):
+        """ The fraction of lookups which were hits """
+        return self.hits / float(max(self.hits + self.misses, 1))
+
+    def clearCache(self):
+        """ Forget every cached entry and reset the statistics """
+        self._cache.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @overrides(Gate)
+    def refreshOutputs(self):
+        key = 0
+        for i, pin in enumerate(self._inputs):
+            if pin._value:
+                key |= 1 << i
+        cache = self._cache
+        if key in cache:
+            self.hits += 1
+            outputs = cache[key]
+            if self.policy == MemoizedGate.LRU:
+                del cache[key]
+                cache[key] = outputs
+        else:
+            self.misses += 1
+            gate = self.gate
+            changed = [i for i, (pin, wrapped) in enumerate(zip(self._inputs, self._wrappedPins))
+                       if wrapped._value != pin._value]
+            gate.setInputs(changed, [self._inputs[i]._value for i in changed])
+            outputs = tuple(gate.getOutPin(i).value for i in xrange(gate.nOutputs))
+            if len(cache) >= self.capacity:
+                cache.popitem(last=False)
+                self.evictions += 1
+            cache[key] = outputs
+        for i, value in enumerate(outputs):
+            self._setOut(i, value)
+
+    def __str__(self):
+        return "%s(%s)<In=%s Out=%s hits=%s misses=%s evictions=%s>" % (self.__class__.__name__,
+            self.gate.__class__.__name__,
+            map(lambda pin: trueFalseToOnesAndZeroes(pin.value), self._inputs),
+            map(lambda pin: trueFalseToOnesAndZeroes(pin.value), self._outputs),
+            self.hits, self.misses, self.evictions)
+
+def hasLatches(gate):
+    """ Whether a gate or anything it is built from keeps state, like a latch """
+    seen = set()
+    stack = [gate]
+    while stack:
+        g = stack.pop()
+        if id(g) in seen:
+            continue
+        seen.add(id(g))
+        if g.hasState:
+            return True
+        stack.extend(g.subGates())
+    return False
 
 
 if __name__ == '__main__':
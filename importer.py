@@ -0,0 +1,664 @@
+"""
+Importing netlists from BLIF and from a structural subset of Verilog.
+
+Both readers go through a file one line at a time and add every gate straight into flat
+arrays (see NetlistBuilder), so even a design with millions of gates never becomes Pin or
+Gate objects. The result is a Netlist whose cells are a CellArray, ready for a Simulator.
+Wrap it in a NetlistGate to use the Gate API.
+
+Gates are lowered onto the netlist's two-input cells: a three-input and becomes two AND
+cells, a nand an AND and a NOT, and so on. Buffers disappear, as fans do when flattening.
+A BLIF .names cover which isn't one of and, or, xor, nand, nor, xnor, not or a buffer
+becomes a LUT cell. And, or, nand and nor covers are told apart by the shape of their
+cubes, so they can have any number of inputs; other covers are limited to MAX_LUT_INPUTS.
+
+As in every Netlist, the inputs are nets 0 to nInputs - 1, in the order they are declared,
+and net nInputs is always False. Cells are put in topological order and cells which no
+output depends on are dropped. Latches are not supported.
+
+BLIF: .model, .inputs, .outputs, .names and .end, with \\ continuing a line.
+
+Verilog: one module, with
+    - input, output and wire declarations, including ranges like [7:0] (bit 0 comes first)
+    - the primitives and, or, xor, nand, nor, xnor, not and buf, with or without an instance
+      name, and several instances in one statement
+    - assign statements whose right hand side is a net, a constant like 1'b0, or nets
+      (each optionally inverted with ~) combined with one of &, | and ^
+"""
+import re
+from array import array
+
+from gates import GateException
+from netlist import Netlist, CellArray, AND, OR, NOT, XOR, LUT
+
+_KIND_CODES = dict((kind, code) for code, kind in enumerate(CellArray.KINDS))
+
+# gate names in both formats, and the cell kind they reduce and whether it's inverted
+GATE_KINDS = {
+    'and': (AND, False),
+    'or': (OR, False),
+    'xor': (XOR, False),
+    'nand': (AND, True),
+    'nor': (OR, True),
+    'xnor': (XOR, True),
+}
+
+# the largest .names cover which can become a LUT cell
+MAX_LUT_INPUTS = 16
+
+class NetlistBuilder(object):
+    """
+    Collects the nets and gates of a netlist in any order, then sorts them into a Netlist.
+    Nets are named with strings; cells are kept in arrays until build().
+    """
+    def __init__(self, name):
+        self.name = name
+        self._nets = {}
+        self._nNets = 0
+        self.inputs = []
+        self.outputs = []
+        self._aliases = {}
+        self._kinds = array('B')
+        self._starts = array('i', [0])
+        self._ins = array('i')
+        self._outs = array('i')
+        self._tables = {}
+        self._zero = self.newNet()
+        self._one = None
+
+    def net(self, name):
+        """ The number of the named net """
+        net = self._nets.get(name)
+        if net is None:
+            net = self._nets[name] = self._nNets
+            self._nNets += 1
+        return net
+
+    def newNet(self):
+        """ A new unnamed net """
+        self._nNets += 1
+        return self._nNets - 1
+
+    def constant(self, value):
+        """ A net which is always value """
+        if not value:
+            return self._zero
+        if self._one is None:
+            self._one = self.newNet()
+            self.cell(NOT, [self._zero], self._one)
+        return self._one
+
+    def addInput(self, name):
+        self.inputs.append(self.net(name))
+
+    def addOutput(self, name):
+        self.outputs.append(self.net(name))
+
+    def cell(self, kind, ins, out, table = None):
+        """ Add one cell of CellArray.KINDS """
+        if table is not None:
+            self._tables[len(self._kinds)] = table
+        self._kinds.append(_KIND_CODES[kind])
+        self._ins.extend(ins)
+        self._starts.append(len(self._ins))
+        self._outs.append(out)
+
+    def alias(self, out, net):
+        """ Make out the same net as net (for a buffer) """
+        if out in self._aliases:
+            raise GateException("Net %s of %s has more than one driver." % (self._netName(out), self.name))
+        self._aliases[out] = net
+
+    def tree(self, kind, ins, out):
+        """ Combine any number of nets with two-input cells of one kind, into out """
+        ins = list(ins)
+        while len(ins) > 2:
+            paired = []
+            for i in xrange(0, len(ins) - 1, 2):
+                net = self.newNet()
+                self.cell(kind, ins[i:i + 2], net)
+                paired.append(net)
+            if len(ins) % 2:
+                paired.append(ins[-1])
+            ins = paired
+        if len(ins) == 2:
+            self.cell(kind, ins, out)
+        else:
+            self.alias(out, ins[0])
+
+    def gate(self, name, ins, out):
+        """ Add a gate called and, or, xor, nand, nor, xnor, not or buf """
+        if name == 'not':
+            if len(ins) != 1:
+                raise GateException("A not gate has one input (got %s)." % len(ins))
+            self.cell(NOT, ins, out)
+        elif name == 'buf':
+            if len(ins) != 1:
+                raise GateException("A buf gate has one input (got %s)." % len(ins))
+            self.alias(out, ins[0])
+        elif name in GATE_KINDS:
+            if not ins:
+                raise GateException("An %s gate needs inputs." % name)
+            kind, inverted = GATE_KINDS[name]
+            if inverted:
+                middle = self.newNet()
+                self.tree(kind, ins, middle)
+                self.cell(NOT, [middle], out)
+            else:
+                self.tree(kind, ins, out)
+        else:
+            raise GateException("Unknown gate %s." % name)
+
+    def _netName(self, net):
+        for name, number in self._nets.iteritems():
+            if number == net:
+                return name
+        return "#%s" % net
+
+    def _resolve(self, net):
+        aliases = self._aliases
+        seen = 0
+        while net in aliases:
+            net = aliases[net]
+            seen += 1
+            if seen > len(aliases):
+                raise GateException("The buffers of %s form a loop." % self.name)
+        return net
+
+    def build(self):
+        """ Sort the cells and number the nets as a Netlist needs """
+        nNets = self._nNets
+        nCells = len(self._kinds)
+        starts = self._starts
+        ins = self._ins
+        outs = self._outs
+        if self._aliases:
+            resolve = self._resolve
+            ins = array('i', [resolve(net) for net in ins])
+            outputs = [resolve(net) for net in self.outputs]
+        else:
+            outputs = list(self.outputs)
+        inputs = self.inputs
+        if len(set(inputs)) != len(inputs):
+            raise GateException("%s declares an input twice." % self.name)
+
+        # which cell drives each net
+        driver = array('i', [-1]) * nNets
+        for net in inputs:
+            driver[net] = -2
+        for net in self._aliases:
+            if driver[net] == -2:
+                raise GateException("Input %s of %s is driven by a gate." % (self._netName(net), self.name))
+        for cell, net in enumerate(outs):
+            if driver[net] != -1 or net in self._aliases:
+                raise GateException("Net %s of %s has more than one driver." % (self._netName(net), self.name))
+            driver[net] = cell
+
+        # depth first from the outputs: cells come out in topological order, and the cells
+        # no output depends on never come out
+        state = bytearray(nCells)
+        level = array('i', [0]) * nCells
+        order = array('i')
+        for root in outputs:
+            cell = driver[root]
+            if cell < 0 or state[cell]:
+                continue
+            stack = [cell]
+            while stack:
+                cell = stack[-1]
+                if state[cell] == 0:
+                    state[cell] = 1
+                    for k in xrange(starts[cell], starts[cell + 1]):
+                        source = driver[ins[k]]
+                        if source >= 0:
+                            if state[source] == 0:
+                                stack.append(source)
+                            elif state[source] == 1:
+                                raise GateException("Cannot import %s: it contains a loop." % self.name)
+                else:
+                    stack.pop()
+                    if state[cell] == 1:
+                        state[cell] = 2
+                        deepest = 0
+                        for k in xrange(starts[cell], starts[cell + 1]):
+                            source = driver[ins[k]]
+                            if source >= 0 and level[source] > deepest:
+                                deepest = level[source]
+                        level[cell] = deepest + 1
+                        order.append(cell)
+
+        # inputs first, then the zero net (which undriven nets join), then the cell outputs
+        nInputs = len(inputs)
+        number = array('i', [nInputs]) * nNets
+        for i, net in enumerate(inputs):
+            number[net] = i
+        for i, cell in enumerate(order):
+            number[outs[cell]] = nInputs + 1 + i
+
+        kinds = self._kinds
+        newKinds = array('B')
+        newStarts = array('i', [0])
+        newIns = array('i')
+        newOuts = array('i')
+        newTables = {}
+        levels = array('i')
+        for i, cell in enumerate(order):
+            newKinds.append(kinds[cell])
+            newIns.extend([number[net] for net in ins[starts[cell]:starts[cell + 1]]])
+            newStarts.append(len(newIns))
+            newOuts.append(nInputs + 1 + i)
+            levels.append(level[cell])
+            if cell in self._tables:
+                newTables[i] = self._tables[cell]
+
+        cells = CellArray(newKinds, newStarts, newIns, newOuts, newTables)
+        return Netlist(self.name, nInputs + 1 + len(order), range(nInputs),
+                       [number[net] for net in outputs], cells, levels, [])
+
+def _parityTable(nInputs):
+    table = 2
+    for j in xrange(1, nInputs):
+        size = 1 << j
+        table |= (~table & ((1 << size) - 1)) << size
+    return table
+
+def coverTable(cubes, nInputs):
+    """
+    The truth table (bit r is the output for row r, with input j in bit j of r) of a BLIF
+    cover: a list of (input pattern, output value) pairs, the patterns made of 0, 1 and -.
+    """
+    onSet = True
+    table = 0
+    for pattern, value in cubes:
+        _checkPattern(pattern, nInputs)
+        onSet = value == '1'
+        fixed = 0
+        free = []
+        for j, char in enumerate(pattern):
+            if char == '1':
+                fixed |= 1 << j
+            elif char == '-':
+                free.append(j)
+        for combination in xrange(1 << len(free)):
+            row = fixed
+            for k, j in enumerate(free):
+                if (combination >> k) & 1:
+                    row |= 1 << j
+            table |= 1 << row
+    if not onSet:
+        table = ~table & ((1 << (1 << nInputs)) - 1)
+    return table
+
+def _checkPattern(pattern, nInputs):
+    if len(pattern) != nInputs:
+        raise GateException("The cover line %r doesn't have %s inputs." % (pattern, nInputs))
+    for char in pattern:
+        if char not in '01-':
+            raise GateException("Bad character %r in the cover line %r." % (char, pattern))
+
+# the gate a cover is, by (shape, literal, output value): a 'cube' cover is one cube of
+# all 1s or all 0s, a 'literals' cover one cube per input with a single 1 or 0 each
+_SHAPES = {
+    ('cube', '1', '1'): 'and', ('cube', '0', '1'): 'nor',
+    ('cube', '1', '0'): 'nand', ('cube', '0', '0'): 'or',
+    ('literals', '1', '1'): 'or', ('literals', '0', '1'): 'nand',
+    ('literals', '1', '0'): 'nor', ('literals', '0', '0'): 'and',
+}
+
+def coverGate(cubes, nInputs):
+    """
+    The name of the and, or, nand or nor gate a BLIF cover of one or more inputs is, from
+    the shape of its cubes alone, or None. Works for any number of inputs, without the
+    truth table.
+    """
+    if not cubes or nInputs == 0:
+        return None
+    values = set(value for pattern, value in cubes)
+    if len(values) != 1:
+        return None
+    for pattern, value in cubes:
+        _checkPattern(pattern, nInputs)
+    value = values.pop()
+    if len(cubes) == 1:
+        literals = set(cubes[0][0])
+        if len(literals) == 1 and '-' not in literals:
+            return _SHAPES[('cube', literals.pop(), value)]
+    if len(cubes) != nInputs:
+        return None
+    positions = set()
+    literals = set()
+    for pattern, value in cubes:
+        stripped = pattern.replace('-', '')
+        if len(stripped) != 1:
+            return None
+        positions.add(pattern.index(stripped))
+        literals.add(stripped)
+    if len(positions) != nInputs or len(literals) != 1:
+        return None
+    return _SHAPES[('literals', literals.pop(), value)]
+
+def addCover(builder, ins, out, cubes):
+    """ Add a BLIF cover as a primitive gate, if it is one, and otherwise a LUT """
+    nInputs = len(ins)
+    name = coverGate(cubes, nInputs)
+    if name is not None:
+        builder.gate(name, ins, out)
+        return
+    if nInputs > MAX_LUT_INPUTS:
+        raise GateException("A cover of %s inputs is too big for a LUT (at most %s)." % (nInputs, MAX_LUT_INPUTS))
+    table = coverTable(cubes, nInputs)
+    full = (1 << (1 << nInputs)) - 1
+    if nInputs == 0:
+        builder.alias(out, builder.constant(table & 1))
+        return
+    if nInputs == 1:
+        if table == 2:
+            builder.alias(out, ins[0])
+        elif table == 1:
+            builder.cell(NOT, ins, out)
+        else:
+            builder.alias(out, builder.constant(table == 3))
+        return
+    top = 1 << ((1 << nInputs) - 1)
+    parity = _parityTable(nInputs)
+    named = {top: 'and', full & ~1: 'or', parity: 'xor',
+             full & ~top: 'nand', 1: 'nor', full & ~parity: 'xnor'}
+    if table in named:
+        builder.gate(named[table], ins, out)
+    else:
+        builder.cell(LUT, ins, out, table)
+
+def _blifLines(stream):
+    """ The lines of a BLIF file without comments or indentation, with continued lines joined, numbered """
+    pending = ''
+    for number, line in enumerate(stream, 1):
+        line = line.split('#', 1)[0].rstrip()
+        if line.endswith('\\'):
+            pending += line[:-1] + ' '
+            continue
+        line = (pending + line).strip()
+        pending = ''
+        if line:
+            yield number, line
+    if pending.strip():
+        yield number, pending.strip()
+
+def readBlif(stream, name = None):
+    """ Import the first model of a BLIF file (an open file, or any iterable of lines) """
+    builder = None
+    cover = None
+    def finishCover():
+        if cover is not None:
+            addCover(builder, cover[0], cover[1], cover[2])
+
+    for number, line in _blifLines(stream):
+        if not line.startswith('.'):
+            if cover is None:
+                raise GateException("Line %s: a cover line outside .names" % number)
+            parts = line.split()
+            if len(parts) == 1 and not cover[0]:
+                cover[2].append(('', parts[0]))
+            elif len(parts) == 2:
+                cover[2].append((parts[0], parts[1]))
+            else:
+                raise GateException("Line %s: bad cover line %r" % (number, line))
+            continue
+
+        finishCover()
+        cover = None
+        words = line.split()
+        directive = words[0]
+        if directive == '.model':
+            if builder is not None:
+                break
+            builder = NetlistBuilder(name or (words[1] if len(words) > 1 else 'blif'))
+            continue
+        if builder is None:
+            builder = NetlistBuilder(name or 'blif')
+        if directive == '.inputs':
+            for word in words[1:]:
+                builder.addInput(word)
+        elif directive == '.outputs':
+            for word in words[1:]:
+                builder.addOutput(word)
+        elif directive == '.names':
+            if len(words) < 2:
+                raise GateException("Line %s: .names needs an output" % number)
+            cover = ([builder.net(word) for word in words[1:-1]], builder.net(words[-1]), [])
+        elif directive == '.end':
+            break
+        else:
+            raise GateException("Line %s: %s is not supported" % (number, directive))
+    finishCover()
+    if builder is None:
+        raise GateException("No model found.")
+    return builder.build()
+
+_PRIMITIVE = re.compile(r'^(and|or|xor|nand|nor|xnor|not|buf)\b(.*)$', re.S)
+_INSTANCE = re.compile(r'\s*(?:[A-Za-z_][\w$]*\s*)?(?:\[[^\]]*\]\s*)?\(([^()]*)\)\s*(?:,|$)')
+_RANGE = re.compile(r'^\[\s*(\d+)\s*:\s*(\d+)\s*\](.*)$', re.S)
+_CONSTANT = re.compile(r"^(?:\d*'[bB])?([01])$")
+_SPACE = re.compile(r'\s+')
+
+def _statements(stream):
+    """ The statements of a Verilog file, without comments, each as one string """
+    pending = []
+    inComment = False
+    for line in stream:
+        text = ''
+        while line:
+            if inComment:
+                end = line.find('*/')
+                if end < 0:
+                    line = ''
+                else:
+                    line = line[end + 2:]
+                    inComment = False
+                continue
+            start = line.find('/*')
+            lineComment = line.find('//')
+            if lineComment >= 0 and (start < 0 or lineComment < start):
+                text += line[:lineComment]
+                line = ''
+            elif start >= 0:
+                text += line[:start] + ' '
+                line = line[start + 2:]
+                inComment = True
+            else:
+                text += line
+                line = ''
+        parts = text.split(';')
+        for part in parts[:-1]:
+            pending.append(part)
+            yield ' '.join(pending).strip()
+            pending = []
+        pending.append(parts[-1])
+    rest = ' '.join(pending).strip()
+    if rest:
+        yield rest
+
+class _VerilogModule(object):
+    """ The state of readVerilog() while it goes through one module """
+    def __init__(self, builder):
+        self.builder = builder
+        self.ranges = {}
+
+    def names(self, declaration):
+        """ The bit names declared by something like "[3:0] a, b" """
+        match = _RANGE.match(declaration.strip())
+        if match:
+            high, low, declaration = int(match.group(1)), int(match.group(2)), match.group(3)
+            step = 1 if high >= low else -1
+            bits = range(low, high + step, step)
+        else:
+            bits = None
+        for name in declaration.replace(',', ' ').split():
+            if name in ('wire', 'reg'):
+                continue
+            if bits is None:
+                yield name
+            else:
+                self.ranges[name] = bits
+                for bit in bits:
+                    yield "%s[%s]" % (name, bit)
+
+    def signal(self, text):
+        """ The nets of one connection: a net, a bit of a bus, a whole bus or a constant """
+        text = _SPACE.sub('', text)
+        constant = _CONSTANT.match(text)
+        if constant:
+            return [self.builder.constant(constant.group(1) == '1')]
+        if text in self.ranges:
+            return [self.builder.net("%s[%s]" % (text, bit)) for bit in self.ranges[text]]
+        return [self.builder.net(text)]
+
+    def operand(self, text):
+        text = text.strip()
+        inverted = False
+        while text.startswith('~'):
+            inverted = not inverted
+            text = text[1:].strip()
+        nets = self.signal(text)
+        if len(nets) != 1:
+            raise GateException("Only single bits can be used in expressions (got %s)." % text)
+        if inverted:
+            net = self.builder.newNet()
+            self.builder.cell(NOT, nets, net)
+            return net
+        return nets[0]
+
+    def assign(self, text):
+        if '=' not in text:
+            raise GateException("Bad assign statement: assign %s" % text)
+        target, expression = text.split('=', 1)
+        out = self.signal(target)
+        if len(out) != 1:
+            raise GateException("Only single bits can be assigned (got %s)." % target.strip())
+        operators = set(char for char in expression if char in '&|^')
+        if len(operators) > 1 or '(' in expression:
+            raise GateException("Only one kind of operator is supported in assign %s" % text)
+        if not operators:
+            self.builder.alias(out[0], self.operand(expression))
+            return
+        operator = operators.pop()
+        ins = [self.operand(part) for part in expression.split(operator)]
+        self.builder.gate({'&': 'and', '|': 'or', '^': 'xor'}[operator], ins, out[0])
+
+    def instances(self, kind, text):
+        """ Add each instance of a primitive in a statement like "nand g1(y, a, b), g2(z, c, d)" """
+        position = 0
+        text = text.strip()
+        while position < len(text):
+            match = _INSTANCE.match(text, position)
+            if not match:
+                raise GateException("Bad %s instance: %s" % (kind, text[position:]))
+            nets = [self.signal(port) for port in match.group(1).split(',')]
+            if any(len(net) != 1 for net in nets):
+                raise GateException("Primitive %s connects single bits only: %s" % (kind, match.group(1)))
+            nets = [net[0] for net in nets]
+            self.builder.gate(kind, nets[1:], nets[0])
+            position = match.end()
+
+def readVerilog(stream, name = None):
+    """ Import the first module of a structural Verilog file (an open file, or any iterable of lines) """
+    module = None
+    for statement in _statements(stream):
+        while statement.startswith('endmodule'):
+            if module is not None:
+                return module.builder.build()
+            statement = statement[len('endmodule'):].strip()
+        if not statement:
+            continue
+        keyword = statement.split(None, 1)[0].split('(', 1)[0]
+        rest = statement[len(keyword):]
+        if keyword == 'module':
+            if module is not None:
+                raise GateException("Module %s has no endmodule." % module.builder.name)
+            header = rest.strip()
+            moduleName = re.match(r'[\w$]*', header).group(0)
+            module = _VerilogModule(NetlistBuilder(name or moduleName or 'verilog'))
+            ports = header[len(moduleName):].strip()
+            if ports.startswith('(') and ports.endswith(')'):
+                # ANSI style declarations in the header
+                current = None
+                for port in re.split(r',\s*(?=input\b|output\b)', ports[1:-1].strip()):
+                    words = port.split(None, 1)
+                    if words and words[0] in ('input', 'output'):
+                        current = words[0]
+                        port = words[1] if len(words) > 1 else ''
+                        for netName in module.names(port):
+                            if current == 'input':
+                                module.builder.addInput(netName)
+                            else:
+                                module.builder.addOutput(netName)
+            continue
+        if module is None:
+            raise GateException("Statement outside a module: %s" % statement)
+        if keyword == 'input':
+            for netName in module.names(rest):
+                module.builder.addInput(netName)
+        elif keyword == 'output':
+            for netName in module.names(rest):
+                module.builder.addOutput(netName)
+        elif keyword in ('wire', 'reg'):
+            for netName in module.names(rest):
+                module.builder.net(netName)
+        elif keyword == 'assign':
+            module.assign(rest)
+        else:
+            match = _PRIMITIVE.match(statement)
+            if not match:
+                raise GateException("Unsupported statement: %s" % statement)
+            module.instances(match.group(1), match.group(2))
+    if module is None:
+        raise GateException("No module found.")
+    return module.builder.build()
+
+def load(path):
+    """ Import a .blif or .v file """
+    with open(path) as stream:
+        if path.endswith('.blif'):
+            return readBlif(stream)
+        if path.endswith('.v'):
+            return readVerilog(stream)
+    raise GateException("Don't know the format of %s (expected .blif or .v)." % path)
+
+def writeBlif(netlist, stream):
+    """ Write a netlist without latches as BLIF, naming nets n0, n1, ... """
+    if netlist.nLatches:
+        raise GateException("BLIF export of latches is not supported (%s)." % netlist.name)
+    stream.write(".model %s\n.inputs %s\n.outputs %s\n" % (netlist.name,
+        " ".join("n%s" % net for net in netlist.inputs), " ".join("o%s" % i for i in xrange(netlist.nOutputs))))
+    covers = {AND: "11 1\n", OR: "1- 1\n-1 1\n", XOR: "10 1\n01 1\n", NOT: "0 1\n"}
+    for kind, ins, outs, aux in netlist.cells:
+        stream.write(".names %s n%s\n" % (" ".join("n%s" % net for net in ins), outs[0]))
+        if kind == LUT:
+            for row in xrange(1 << len(ins)):
+                if (aux >> row) & 1:
+                    stream.write("%s 1\n" % "".join(str((row >> j) & 1) for j in xrange(len(ins))))
+        else:
+            stream.write(covers[kind])
+    for i, net in enumerate(netlist.outputs):
+        if net == netlist.nInputs and net not in netlist.inputs:
+            stream.write(".names o%s\n" % i)
+        else:
+            stream.write(".names n%s o%s\n1 1\n" % (net, i))
+    stream.write(".end\n")
+
+def writeVerilog(netlist, stream):
+    """ Write a netlist of and, or, xor and not cells as a structural Verilog module """
+    stream.write("module %s(%s);\n" % (netlist.name, ", ".join(
+        ["n%s" % net for net in netlist.inputs] + ["o%s" % i for i in xrange(netlist.nOutputs)])))
+    stream.write("  input %s;\n  output %s;\n" % (", ".join("n%s" % net for net in netlist.inputs),
+        ", ".join("o%s" % i for i in xrange(netlist.nOutputs))))
+    names = {AND: 'and', OR: 'or', XOR: 'xor', NOT: 'not'}
+    for kind, ins, outs, aux in netlist.cells:
+        if kind not in names:
+            raise GateException("Verilog export of %s cells is not supported (%s)." % (kind, netlist.name))
+        stream.write("  %s (n%s, %s);\n" % (names[kind], outs[0], ", ".join("n%s" % net for net in ins)))
+    for i, net in enumerate(netlist.outputs):
+        if net == netlist.nInputs:
+            stream.write("  assign o%s = 1'b0;\n" % i)
+        else:
+            stream.write("  assign o%s = n%s;\n" % (i, net))
+    stream.write("endmodule\n")
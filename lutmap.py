@@ -0,0 +1,151 @@
+"""
+Technology mapping of a Netlist onto k-input lookup tables.
+
+mapLuts() covers the combinational cells of a netlist with cones of at most k inputs and
+replaces each cone with a single LUT cell holding the cone's truth table. Latches are kept
+as they are. The mapped netlist has the same inputs and outputs as the original.
+
+Cones are chosen with cut enumeration: every net gets a short list of the best k-input
+"cuts" (sets of nets which completely determine it), built by merging the cuts of the
+cell's inputs. Cuts are ranked by "area flow", an estimate of how many LUTs the cone
+below a net costs when nets with several readers are shared between them, and then by
+depth. The cover starts from the outputs and uses the best cut of each net it needs.
+Fewer LUTs means fewer steps per vector, which is what matters to a software simulator.
+
+A cell with more than k inputs (an imported netlist can have LUT cells of up to 16) is
+kept as it is, and its output is a leaf of the cuts above it.
+"""
+from gates import GateException
+from netlist import Netlist, AND, OR, NOT, XOR, LUT, evaluateCell
+
+_COMBINATIONAL = set([AND, OR, NOT, XOR, LUT])
+
+def _pattern(i, nLeaves):
+    """ The truth table column of the i-th of nLeaves variables """
+    word = 0
+    for row in xrange(1 << nLeaves):
+        if (row >> i) & 1:
+            word |= 1 << row
+    return word
+
+def _truthTable(cells, driver, root, leaves):
+    """ Evaluate the cone from leaves to root on every combination of the leaves """
+    cone = set()
+    stack = [root]
+    while stack:
+        net = stack.pop()
+        if net in leaves or net not in driver or driver[net] in cone:
+            continue
+        cone.add(driver[net])
+        stack.extend(cells[driver[net]][1])
+    rows = 1 << len(leaves)
+    values = dict((leaf, _pattern(i, len(leaves))) for i, leaf in enumerate(leaves))
+    for index in sorted(cone):
+        evaluateCell(cells[index], values, None, rows, (1 << rows) - 1)
+    return values[root]
+
+def mapLuts(netlist, k = 4, maxCuts = 8):
+    """
+    Map a netlist onto LUTs with at most k inputs.
+    maxCuts is the number of cuts remembered for each net; more finds better covers but takes longer.
+    """
+    if not 2 <= k <= 16:
+        # the AND, OR and XOR cells have two inputs, which wouldn't fit in a smaller LUT
+        raise GateException("LUTs must have between 2 and 16 inputs (got %s)." % k)
+    cells = netlist.cells
+
+    fanout = {}
+    for kind, ins, outs, aux in cells:
+        for net in ins:
+            fanout[net] = fanout.get(net, 0) + 1
+    for net in netlist.outputs:
+        fanout[net] = fanout.get(net, 0) + 1
+
+    # best cuts (as sorted tuples of leaves), LUT depth and area flow for every net
+    driver = {}
+    depth = {}
+    area = {}
+    cuts = {}
+    best = {}
+    # the outputs of the cells too wide to map
+    wide = set()
+
+    def sourceNet(net, level):
+        depth[net] = level
+        area[net] = 0.0
+        cuts[net] = [(net,)]
+
+    def cost(cut):
+        flow = 1.0 + sum(area[leaf] / max(fanout.get(leaf, 1), 1) for leaf in cut)
+        return (flow, 1 + max(depth[leaf] for leaf in cut), len(cut), cut)
+
+    for net in netlist.inputs:
+        sourceNet(net, 0)
+    for index, (kind, ins, outs, aux) in enumerate(cells):
+        for net in ins:
+            if net not in depth:
+                # an undriven net, which is always False
+                sourceNet(net, 0)
+        if kind not in _COMBINATIONAL:
+            level = 1 + max(depth[net] for net in ins)
+            for net in outs:
+                sourceNet(net, level)
+            continue
+        out = outs[0]
+        driver[out] = index
+        if len(set(ins)) > k:
+            wide.add(out)
+            best[out] = tuple(sorted(set(ins)))
+            area[out], depth[out] = cost(best[out])[:2]
+            cuts[out] = [(out,)]
+            continue
+        merged = set([()])
+        for net in ins:
+            merged = set(tuple(sorted(set(a).union(b))) for a in merged for b in cuts[net])
+            merged = set(cut for cut in merged if len(cut) <= k)
+        ranked = sorted(merged, key=cost)[:maxCuts]
+        best[out] = ranked[0]
+        area[out], depth[out] = cost(ranked[0])[:2]
+        cuts[out] = [(out,)] + ranked
+
+    # cover the circuit, starting from the nets that have to exist
+    required = list(netlist.outputs)
+    for kind, ins, outs, aux in cells:
+        if kind not in _COMBINATIONAL:
+            required.extend(ins)
+    chosen = set()
+    while required:
+        net = required.pop()
+        if net in chosen or net not in best:
+            continue
+        chosen.add(net)
+        required.extend(best[net])
+
+    # build the mapped cells in the original topological order, renumbering nets densely
+    renumber = dict((net, net) for net in xrange(netlist.nInputs + 1))
+    def newNet(net):
+        renumber[net] = len(renumber)
+        return renumber[net]
+
+    mapped = []
+    for index, (kind, ins, outs, aux) in enumerate(cells):
+        if kind not in _COMBINATIONAL:
+            mapped.append((kind, tuple(renumber[net] for net in ins), tuple(newNet(net) for net in outs), aux))
+        elif outs[0] in wide:
+            if outs[0] in chosen:
+                mapped.append((kind, tuple(renumber[net] for net in ins), (newNet(outs[0]),), aux))
+        elif outs[0] in chosen:
+            leaves = best[outs[0]]
+            table = _truthTable(cells, driver, outs[0], leaves)
+            mapped.append((LUT, tuple(renumber[net] for net in leaves), (newNet(outs[0]),), table))
+
+    netLevel = [0] * len(renumber)
+    levels = []
+    for kind, ins, outs, aux in mapped:
+        level = 1 + max([netLevel[net] for net in ins] or [0])
+        for net in outs:
+            netLevel[net] = level
+        levels.append(level)
+
+    return Netlist(netlist.name, len(renumber), list(netlist.inputs),
+                   [renumber[net] for net in netlist.outputs], mapped, levels, list(netlist.latchInit))
@@ -0,0 +1,1019 @@
+"""
+Flattening and compiled evaluation of Gates.
+
+A Gate is a graph of Pin objects, and every setIn() walks that graph one pin at a time.
+flatten() turns a Gate into a Netlist: a list of primitive cells (and, or, not, xor and
+SR latches) in topological order, connected by integer net numbers. Fans disappear
+completely since all of their outputs are the same net as their input.
+
+A Simulator evaluates a Netlist on many input vectors at once. Each net holds a Python int
+in which bit j is the value of that net for vector j, so one pass over the cells evaluates
+a whole batch of vectors. A CompiledSimulator does the same with generated Python code.
+A CompiledCircuit is the read-only part of a CompiledSimulator, which threads can share,
+with the latch state kept separately in a Context for each thread. A Circuit evaluates a
+Netlist one input change at a time, like a Gate, and keeps its whole state in one buffer
+so that it can be snapshotted and forked.
+"""
+import heapq
+import random
+from array import array
+
+from gates import overrides, GateException, Gate, InputPin, OutputPin, And, Or, Not, Xor, Fan, SRLatch
+
+AND = 'and'
+OR = 'or'
+NOT = 'not'
+XOR = 'xor'
+FAN = 'fan'
+LATCH = 'latch'
+LUT = 'lut'
+
+# the kinds of function generateSource() can write
+BATCH = 'batch'
+SCALAR = 'scalar'
+LANES = 'lanes'
+
+_PRIMITIVES = {
+    And: AND,
+    Or: OR,
+    Not: NOT,
+    Xor: XOR,
+    Fan: FAN,
+    SRLatch: LATCH,
+}
+
+class Netlist(object):
+    """
+    A flattened, levelized circuit.
+
+    Nets are numbered from 0. The first nInputs nets are the input pins of the
+    original gate, in order. Every cell is a tuple (kind, inNets, outNets, aux):
+        - cells are stored in topological order, so evaluating them in order is enough
+        - levels[i] is the level of cells[i]; a cell only reads nets driven by
+          lower levels (inputs are level 0)
+        - for a LATCH cell, inNets is (reset, set), outNets is (Q, not Q) and aux is the
+          latch's slot in the state vector
+        - for a LUT cell (see lutmap.py), aux is the truth table as an integer: bit i is the
+          output when inNets[j] holds bit j of i
+        - aux is None for the other cells
+    Nets which nothing drives are always False.
+
+    cells is usually a list, but any sequence of such tuples will do (see CellArray).
+    """
+    def __init__(self, name, nNets, inputs, outputs, cells, levels, latchInit):
+        self.name = name
+        self.nNets = nNets
+        self.inputs = inputs
+        self.outputs = outputs
+        self.cells = cells
+        self.levels = levels
+        self.latchInit = latchInit
+
+    @property
+    def nInputs(self):
+        return len(self.inputs)
+
+    @property
+    def nOutputs(self):
+        return len(self.outputs)
+
+    @property
+    def nLatches(self):
+        return len(self.latchInit)
+
+    @property
+    def depth(self):
+        if not self.levels:
+            return 0
+        return max(self.levels)
+
+    def __str__(self):
+        return "Netlist<%s nets=%s cells=%s depth=%s latches=%s>" % (
+            self.name, self.nNets, len(self.cells), self.depth, self.nLatches)
+
+    def __repr__(self):
+        return str(self)
+
+class CellArray(object):
+    """
+    A compact, read-only sequence of cells with one output each, such as imported netlists
+    have (see importer.py). Instead of a tuple per cell, the kinds, nets and truth tables are
+    kept in flat arrays, and the tuples are made as the cells are read.
+        - kinds[i] is the index of the kind of cells[i] in CellArray.KINDS
+        - the inputs of cells[i] are ins[starts[i]:starts[i + 1]]
+        - outs[i] is its output
+        - tables maps the index of each LUT cell to its truth table
+    """
+    KINDS = (AND, OR, NOT, XOR, LUT)
+
+    def __init__(self, kinds, starts, ins, outs, tables):
+        self.kinds = kinds
+        self.starts = starts
+        self.ins = ins
+        self.outs = outs
+        self.tables = tables
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.kinds)
+        if not 0 <= index < len(self.kinds):
+            raise IndexError("cell index out of range")
+        return (CellArray.KINDS[self.kinds[index]], tuple(self.ins[self.starts[index]:self.starts[index + 1]]),
+                (self.outs[index],), self.tables.get(index))
+
+    def __iter__(self):
+        kinds = CellArray.KINDS
+        starts = self.starts
+        ins = self.ins
+        tables = self.tables
+        outs = self.outs
+        for index, kind in enumerate(self.kinds):
+            yield (kinds[kind], tuple(ins[starts[index]:starts[index + 1]]), (outs[index],), tables.get(index))
+
+def flatten(gate):
+    """
+    Flatten a gate into a Netlist of primitive cells.
+
+    Latches start in whatever state the gate's latches are in right now.
+    Cells which cannot affect any output are dropped.
+    """
+    name = gate.__class__.__name__
+
+    # every gate kept inside the circuit, so we know which non-primitive gates are composites
+    composites = {}
+    stack = [gate]
+    seen = set()
+    prims = []
+    while stack:
+        g = stack.pop()
+        if id(g) in seen:
+            continue
+        seen.add(id(g))
+        if type(g) in _PRIMITIVES:
+            prims.append(g)
+        else:
+            composites[id(g)] = g
+            stack.extend(g.subGates())
+
+    # primitives which are only reachable through pin connections
+    def pinGate(pin):
+        g = pin.gate
+        if type(g) in _PRIMITIVES:
+            return g
+        if id(g) in composites:
+            # an input pin which was never replaced, like FourToTwoLineEncoder's In2
+            return None
+        raise GateException("Cannot flatten %s: don't know how to compile %s." % (name, g.__class__.__name__))
+
+    primIds = set(id(p) for p in prims)
+    stack = [pin for pin in gate._inputs if isinstance(pin, InputPin)]
+    for p in prims:
+        for out in p._outputs:
+            stack.extend(out.connections)
+    while stack:
+        pin = stack.pop()
+        if not isinstance(pin, InputPin):
+            continue
+        g = pinGate(pin)
+        if g is not None and id(g) not in primIds:
+            primIds.add(id(g))
+            prims.append(g)
+            for out in g._outputs:
+                stack.extend(out.connections)
+
+    # the outputs of a composite are outputs of the gates inside it; a gate which sets its own
+    # output pins (like a WordGate) computes them in Python, which can't be flattened
+    primOutputs = set(id(out) for p in prims for out in p._outputs)
+    for g in composites.values():
+        if any(id(out) not in primOutputs for out in g._outputs):
+            raise GateException("Cannot flatten %s: don't know how to compile %s." % (name, g.__class__.__name__))
+
+    # who drives each pin: an input index, or an OutputPin of a primitive
+    owner = {}
+    for p in prims:
+        for out in p._outputs:
+            owner[id(out)] = p
+    driver = {}
+    for k, pin in enumerate(gate._inputs):
+        driver[id(pin)] = k
+    for p in prims:
+        for out in p._outputs:
+            for pin in out.connections:
+                if id(pin) in driver or id(pin) in owner:
+                    raise GateException("Cannot flatten %s: a pin has more than one driver." % name)
+                driver[id(pin)] = out
+
+    # topological order of the primitives
+    deps = {}
+    users = dict((id(p), []) for p in prims)
+    for p in prims:
+        ds = set()
+        for pin in p._inputs:
+            src = driver.get(id(pin))
+            if src is not None and not isinstance(src, int):
+                ds.add(id(owner[id(src)]))
+        deps[id(p)] = len(ds)
+        for d in ds:
+            users[d].append(p)
+    ready = [p for p in prims if deps[id(p)] == 0]
+    order = []
+    while ready:
+        p = ready.pop()
+        order.append(p)
+        for u in users[id(p)]:
+            deps[id(u)] -= 1
+            if deps[id(u)] == 0:
+                ready.append(u)
+    if len(order) != len(prims):
+        raise GateException("Cannot flatten %s: it contains a loop." % name)
+
+    # allocate nets; net nInputs is the constant False net for undriven pins
+    nInputs = len(gate._inputs)
+    zero = nInputs
+    nNets = [nInputs + 1]
+    netOf = {}
+
+    def pinNet(pin):
+        if id(pin) in netOf:
+            return netOf[id(pin)]
+        src = driver.get(id(pin))
+        if src is None:
+            return zero
+        if isinstance(src, int):
+            return src
+        return netOf[id(src)]
+
+    def newNet():
+        nNets[0] += 1
+        return nNets[0] - 1
+
+    cells = []
+    latchGates = []
+    for p in order:
+        kind = _PRIMITIVES[type(p)]
+        ins = tuple(pinNet(pin) for pin in p._inputs)
+        if kind == FAN:
+            for out in p._outputs:
+                netOf[id(out)] = ins[0]
+            continue
+        outs = tuple(newNet() for out in p._outputs)
+        for out, net in zip(p._outputs, outs):
+            netOf[id(out)] = net
+        aux = None
+        if kind == LATCH:
+            aux = len(latchGates)
+            latchGates.append(p)
+        cells.append((kind, ins, outs, aux))
+    outputs = [pinNet(pin) for pin in gate._outputs]
+
+    # drop cells which no output depends on
+    live = set(outputs)
+    keep = []
+    for cell in reversed(cells):
+        if live.intersection(cell[2]):
+            keep.append(cell)
+            live.update(cell[1])
+    keep.reverse()
+
+    # renumber the surviving nets and latches densely
+    renumber = dict((i, i) for i in xrange(nInputs + 1))
+    latchSlots = {}
+    for kind, ins, outs, aux in keep:
+        for net in outs:
+            renumber[net] = len(renumber)
+        if kind == LATCH:
+            latchSlots[aux] = len(latchSlots)
+    cells = []
+    netLevel = [0] * len(renumber)
+    levels = []
+    for kind, ins, outs, aux in keep:
+        ins = tuple(renumber[n] for n in ins)
+        outs = tuple(renumber[n] for n in outs)
+        level = 1 + max([netLevel[n] for n in ins] or [0])
+        for net in outs:
+            netLevel[net] = level
+        if aux is not None:
+            aux = latchSlots[aux]
+        cells.append((kind, ins, outs, aux))
+        levels.append(level)
+    latchInit = [0] * len(latchSlots)
+    for old, new in latchSlots.items():
+        latchInit[new] = 1 if latchGates[old].getOutPin(0).value else 0
+
+    return Netlist(name, len(renumber), range(nInputs), [renumber[n] for n in outputs],
+                   cells, levels, latchInit)
+
+def evaluateLatch(q, r, s, width):
+    """
+    Run an SR latch with state q over width vectors, one bit at a time.
+    Returns the final state and the word of Q values.
+    """
+    if not (r | s):
+        if q:
+            return q, (1 << width) - 1
+        return q, 0
+    word = 0
+    for j in xrange(width):
+        bit = 1 << j
+        if r & bit:
+            if s & bit:
+                # a race, just like SRLatch
+                q = random.randint(1, 10) % 2
+            else:
+                q = 0
+        elif s & bit:
+            q = 1
+        if q:
+            word |= bit
+    return q, word
+
+def evaluateLut(table, words, mask):
+    """ Evaluate a LUT over a batch of vectors by OR-ing together the rows which are True """
+    result = 0
+    for row in xrange(1 << len(words)):
+        if (table >> row) & 1:
+            term = mask
+            for i, word in enumerate(words):
+                if (row >> i) & 1:
+                    term &= word
+                else:
+                    term &= ~word
+            result |= term
+    return result & mask
+
+def lutTuple(table, nInputs):
+    """ A LUT as nested tuples, indexed by its last input first: lutTuple(t, 2)[b][a] """
+    if nInputs == 0:
+        return table & 1
+    half = 1 << (nInputs - 1)
+    return (lutTuple(table & ((1 << half) - 1), nInputs - 1), lutTuple(table >> half, nInputs - 1))
+
+def evaluateCell(cell, values, state, width, mask):
+    """ Evaluate one cell in place over a batch of width vectors """
+    kind, ins, outs, aux = cell
+    if kind == AND:
+        values[outs[0]] = values[ins[0]] & values[ins[1]]
+    elif kind == OR:
+        values[outs[0]] = values[ins[0]] | values[ins[1]]
+    elif kind == XOR:
+        values[outs[0]] = values[ins[0]] ^ values[ins[1]]
+    elif kind == NOT:
+        values[outs[0]] = ~values[ins[0]] & mask
+    elif kind == LATCH:
+        state[aux], word = evaluateLatch(state[aux], values[ins[0]], values[ins[1]], width)
+        values[outs[0]] = word
+        values[outs[1]] = ~word & mask
+    elif kind == LUT:
+        if width == 1:
+            # a single vector is just one lookup
+            row = 0
+            for net in reversed(ins):
+                row = row << 1 | values[net]
+            values[outs[0]] = (aux >> row) & 1
+        else:
+            values[outs[0]] = evaluateLut(aux, [values[net] for net in ins], mask)
+    else:
+        raise GateException("Unknown cell kind %s" % kind)
+
+def packVectors(vectors, nBits):
+    """ Pack a list of input vectors into one word per bit position (bit j is vector j) """
+    words = [0] * nBits
+    for j, vector in enumerate(vectors):
+        bit = 1 << j
+        for i in xrange(nBits):
+            if vector[i]:
+                words[i] |= bit
+    return words
+
+def unpackWords(words, width):
+    """ The inverse of packVectors(): turn words back into a list of tuples of 0s and 1s """
+    return [tuple(int((word >> j) & 1) for word in words) for j in xrange(width)]
+
+class Simulator(object):
+    """
+    Evaluates a Netlist in a single process.
+    The simulator owns the latch state, so consecutive runs continue where the last one stopped.
+    """
+    def __init__(self, netlist, batchSize = 1024):
+        self.netlist = netlist
+        self.batchSize = batchSize
+        self.state = list(netlist.latchInit)
+
+    def evaluate(self, inWords, width):
+        """ Evaluate one batch of packed inputs and return the value of every net """
+        netlist = self.netlist
+        values = [0] * netlist.nNets
+        for net, word in zip(netlist.inputs, inWords):
+            values[net] = word
+        state = self.state
+        mask = (1 << width) - 1
+        for cell in netlist.cells:
+            evaluateCell(cell, values, state, width, mask)
+        return values
+
+    def evaluateOutputs(self, inWords, width):
+        """ Evaluate one batch of packed inputs and return the output words """
+        values = self.evaluate(inWords, width)
+        return [values[net] for net in self.netlist.outputs]
+
+    def run(self, vectors):
+        """ Apply each input vector in turn and return a list of output tuples """
+        netlist = self.netlist
+        results = []
+        for start in xrange(0, len(vectors), self.batchSize):
+            batch = vectors[start:start + self.batchSize]
+            words = self.evaluateOutputs(packVectors(batch, netlist.nInputs), len(batch))
+            results.extend(unpackWords(words, len(batch)))
+        return results
+
+    def step(self, vector):
+        """ Apply a single input vector and return the output tuple """
+        return self.run([vector])[0]
+
+def generateSource(netlist, mode = BATCH):
+    """
+    Generate the source of a function which evaluates the whole netlist in straight-line code:
+        evaluate(inWords, state, width, mask, choices = None, races = None) -> tuple of output words
+    The mode is one of
+        - BATCH: like Simulator.evaluate(), the vectors of a batch are applied one after
+          the other, so the latch state carries over from each bit to the next
+        - SCALAR: only one vector at a time (width 1, inputs 0 or 1), which makes every LUT
+          a single lookup in a table of nested tuples (see lutTables())
+        - LANES: every bit is an independent simulation, so state[i] is a word holding the
+          state of latch i in each lane and is updated in place. When a latch sees a race
+          (both inputs high), the outcome is taken from the same bit of choices[i], and
+          races[i] is set to the lanes where latch i raced.
+    The source defines makeEvaluate(tables), which returns the evaluate function; use
+    compileSource() to get it.
+    """
+    lines = ["def evaluate(inWords, state, width, mask, choices = None, races = None):"]
+    nTables = 0
+    if netlist.nInputs:
+        lines.append("    %s, = inWords" % ", ".join("v%d" % net for net in netlist.inputs))
+    driven = set(netlist.inputs)
+    for kind, ins, outs, aux in netlist.cells:
+        for net in ins:
+            if net not in driven:
+                lines.append("    v%d = 0" % net)
+                driven.add(net)
+        driven.update(outs)
+    for net in netlist.outputs:
+        if net not in driven:
+            lines.append("    v%d = 0" % net)
+            driven.add(net)
+
+    if mode == SCALAR:
+        invert = "%s ^ 1"
+    else:
+        invert = "~%s & mask"
+    for kind, ins, outs, aux in netlist.cells:
+        a = ["v%d" % net for net in ins]
+        out = "v%d" % outs[0]
+        if kind == AND:
+            lines.append("    %s = %s & %s" % (out, a[0], a[1]))
+        elif kind == OR:
+            lines.append("    %s = %s | %s" % (out, a[0], a[1]))
+        elif kind == XOR:
+            lines.append("    %s = %s ^ %s" % (out, a[0], a[1]))
+        elif kind == NOT:
+            lines.append("    %s = %s" % (out, invert % a[0]))
+        elif kind == LATCH and mode == LANES:
+            r, s = a
+            lines.append("    races[%d] = %s & %s" % (aux, r, s))
+            lines.append("    state[%d] = %s = (%s & ~%s) | (state[%d] & ~(%s | %s)) | (races[%d] & choices[%d])" % (
+                aux, out, s, r, aux, r, s, aux, aux))
+            lines.append("    v%d = %s" % (outs[1], invert % out))
+        elif kind == LATCH:
+            lines.append("    state[%d], %s = evaluateLatch(state[%d], %s, %s, width)" % (aux, out, aux, a[0], a[1]))
+            lines.append("    v%d = %s" % (outs[1], invert % out))
+        elif kind == LUT and mode == SCALAR:
+            # index a nested tuple by one input at a time, which is quicker than shifting
+            lines.append("    %s = t%d%s" % (out, nTables, "".join("[%s]" % name for name in reversed(a))))
+            nTables += 1
+        elif kind == LUT:
+            lines.extend("    " + line for line in lutSource(aux, a, out))
+        else:
+            raise GateException("Unknown cell kind %s" % kind)
+    lines.append("    return (%s)" % "".join("v%d, " % net for net in netlist.outputs))
+
+    # the tables are unpacked into closure variables, which are quicker to look up than globals
+    outer = ["def makeEvaluate(tables):"]
+    if nTables:
+        outer.append("    %s, = tables" % ", ".join("t%d" % i for i in xrange(nTables)))
+    outer.extend("    " + line for line in lines)
+    outer.append("    return evaluate")
+    return "\n".join(outer) + "\n"
+
+def lutSource(table, names, out):
+    """
+    Lines of code which set out to a LUT of the words called names, for generateSource().
+    The table is split on its last input again and again (Shannon expansion), which makes a
+    tree of multiplexers; a half which is constant, equal to the other half or its inverse
+    needs no multiplexer, and equal halves anywhere in the tree are computed once.
+    """
+    lines = []
+    made = {}
+    def build(table, n, top):
+        full = (1 << (1 << n)) - 1
+        table &= full
+        if table == 0:
+            return "0"
+        if table == full:
+            return "mask"
+        if (table, n) in made:
+            return made[(table, n)]
+        half = 1 << (n - 1)
+        lowTable = table & ((1 << half) - 1)
+        highTable = table >> half
+        x = names[n - 1]
+        if lowTable == highTable:
+            return build(lowTable, n - 1, top)
+        low = build(lowTable, n - 1, False)
+        if highTable == ~lowTable & ((1 << half) - 1) and low not in ("0", "mask"):
+            expression = "%s ^ %s" % (x, low)
+        else:
+            high = build(highTable, n - 1, False)
+            if low == "0":
+                expression = x if high == "mask" else "%s & %s" % (x, high)
+            elif high == "0":
+                expression = "%s & ~%s" % (low, x)
+            elif high == "mask":
+                expression = "%s | %s" % (x, low)
+            elif low == "mask":
+                expression = "~%s & mask | %s" % (x, high)
+            else:
+                expression = "%s ^ (%s ^ %s) & %s" % (low, high, low, x)
+        if expression == x:
+            return x
+        if top:
+            return expression
+        name = "%s_%d" % (out, len(lines))
+        lines.append("%s = %s" % (name, expression))
+        made[(table, n)] = name
+        return name
+    lines.append("%s = %s" % (out, build(table, len(names), True)))
+    return lines
+
+def lutTables(netlist):
+    """ The truth table of every LUT in the netlist as nested tuples, in order """
+    return [lutTuple(aux, len(ins)) for kind, ins, outs, aux in netlist.cells if kind == LUT]
+
+def compileSource(source, netlist):
+    """ Compile the source from generateSource() into an evaluate function for the netlist """
+    return loadEvaluator(compile(source, "<netlist %s>" % netlist.name, "exec"), netlist)
+
+def loadEvaluator(code, netlist):
+    """ Make the evaluate function for a netlist from the compiled code of its generated source """
+    namespace = {'evaluateLatch': evaluateLatch}
+    exec code in namespace
+    return namespace['makeEvaluate'](lutTables(netlist))
+
+def compileCodes(netlist, modes = (BATCH, SCALAR)):
+    """ The compiled code of the generated source for each mode, for loadEvaluator() """
+    return dict((mode, compile(generateSource(netlist, mode), "<netlist %s>" % netlist.name, "exec"))
+                for mode in modes)
+
+class CompiledSimulator(Simulator):
+    """
+    A Simulator which generates straight-line Python code for its netlist, with every net in
+    a local variable, instead of interpreting the cells one by one.
+    Generating the code takes time proportional to the size of the netlist, so this pays off
+    when the netlist is used for more than a few vectors. codes is the output of
+    compileCodes(), if it has already been done (see circuitcache.py).
+
+    It is a CompiledCircuit with a single Context, which holds the latch state.
+    """
+    def __init__(self, netlist, batchSize = 1024, codes = None):
+        self.circuit = CompiledCircuit(netlist, codes, batchSize)
+        self.context = self.circuit.newContext()
+        super(CompiledSimulator, self).__init__(netlist, batchSize)
+
+    @property
+    def state(self):
+        return self.context.state
+
+    @state.setter
+    def state(self, state):
+        self.context.state = state
+
+    @overrides(Simulator)
+    def evaluateOutputs(self, inWords, width):
+        return self.circuit.evaluateOutputs(self.context, inWords, width)
+
+    @overrides(Simulator)
+    def run(self, vectors):
+        return self.context.run(vectors)
+
+    @overrides(Simulator)
+    def step(self, vector):
+        return self.context.step(vector)
+
+class CompiledCircuit(object):
+    """
+    A compiled netlist which can be shared between threads.
+
+    A CompiledCircuit never changes after it is made: it only holds the netlist and its
+    generated evaluate functions, which keep everything in local variables. Everything which
+    does change, the latch state, lives in a Context, so any number of threads can evaluate
+    the same CompiledCircuit at once as long as each uses its own Context:
+
+        adder = CompiledCircuit(flatten(FourBitAdder()))
+        pool.map(lambda vectors: adder.newContext().run(vectors), chunks)
+    """
+    __slots__ = ('_netlist', '_evaluateBatch', '_evaluateOne', '_batchSize')
+
+    def __init__(self, netlist, codes = None, batchSize = 1024):
+        if codes is None:
+            codes = compileCodes(netlist)
+        assign = super(CompiledCircuit, self).__setattr__
+        assign('_netlist', netlist)
+        assign('_evaluateBatch', loadEvaluator(codes[BATCH], netlist))
+        assign('_evaluateOne', loadEvaluator(codes[SCALAR], netlist))
+        assign('_batchSize', batchSize)
+
+    def __setattr__(self, name, value):
+        raise GateException("A CompiledCircuit (%s) cannot be changed." % self._netlist.name)
+
+    @property
+    def netlist(self):
+        return self._netlist
+
+    @property
+    def nInputs(self):
+        return self._netlist.nInputs
+
+    @property
+    def nOutputs(self):
+        return self._netlist.nOutputs
+
+    def newContext(self):
+        """ A fresh Context, with the latches in their initial state """
+        return Context(self, list(self._netlist.latchInit))
+
+    def evaluateOutputs(self, context, inWords, width):
+        """ Evaluate one batch of packed inputs in a context and return the output words """
+        return self._evaluateBatch(inWords, context.state, width, (1 << width) - 1)
+
+    def run(self, context, vectors):
+        """ Apply each input vector in turn in a context and return a list of output tuples """
+        nInputs = self._netlist.nInputs
+        results = []
+        for start in xrange(0, len(vectors), self._batchSize):
+            batch = vectors[start:start + self._batchSize]
+            words = self.evaluateOutputs(context, packVectors(batch, nInputs), len(batch))
+            results.extend(unpackWords(words, len(batch)))
+        return results
+
+    def step(self, context, vector):
+        """ Apply a single input vector in a context and return the output tuple """
+        return self._evaluateOne([1 if bit else 0 for bit in vector], context.state, 1, 1)
+
+    def __str__(self):
+        return "CompiledCircuit<%s>" % self._netlist
+
+    def __repr__(self):
+        return str(self)
+
+class Context(object):
+    """
+    The state of one simulation of a CompiledCircuit: the latch state, continued from one
+    run() to the next. A context should only be used by one thread at a time.
+    """
+    __slots__ = ('circuit', 'state')
+
+    def __init__(self, circuit, state):
+        self.circuit = circuit
+        self.state = state
+
+    def run(self, vectors):
+        return self.circuit.run(self, vectors)
+
+    def step(self, vector):
+        return self.circuit.step(self, vector)
+
+    def fork(self):
+        """ An independent context in the same state """
+        return Context(self.circuit, list(self.state))
+
+    def __str__(self):
+        return "Context<%s state=%s>" % (self.circuit.netlist.name, self.state)
+
+    def __repr__(self):
+        return str(self)
+
+_AND_CODE, _OR_CODE, _NOT_CODE, _XOR_CODE = [CellArray.KINDS.index(kind) for kind in (AND, OR, NOT, XOR)]
+_LATCH_CODE = len(CellArray.KINDS)
+
+class Circuit(object):
+    """
+    Simulates a Netlist one input change at a time, like a Gate.
+
+    All of the state of a circuit is one bytearray: the value of every net, followed by the
+    state of every latch. snapshot(), restore() and fork() are therefore a single copy.
+    A fork shares the (read-only) netlist and cell arrays with the circuit it came from.
+
+    The cells are kept in flat arrays (those of a CellArray are used as they are), with the
+    cells reading each net in fanCells[fanStarts[net]:fanStarts[net + 1]]. Setting an input
+    only evaluates the cells reading a net which changed, level by level.
+    """
+    KINDS = CellArray.KINDS + (LATCH,)
+
+    def __init__(self, netlist):
+        self.netlist = netlist
+        cells = netlist.cells
+        if isinstance(cells, CellArray):
+            kinds, starts, ins, outs, aux = cells.kinds, cells.starts, cells.ins, cells.outs, cells.tables
+        else:
+            codes = dict((kind, code) for code, kind in enumerate(Circuit.KINDS))
+            kinds = array('B')
+            starts = array('i', [0])
+            ins = array('i')
+            outs = array('i')
+            aux = {}
+            for i, (kind, cellIns, cellOuts, cellAux) in enumerate(cells):
+                kinds.append(codes[kind])
+                ins.extend(cellIns)
+                starts.append(len(ins))
+                outs.append(cellOuts[0])
+                if kind == LATCH:
+                    # the latch's slot in the state, and its not Q net
+                    aux[i] = (netlist.nNets + cellAux, cellOuts[1])
+                elif kind == LUT:
+                    aux[i] = cellAux
+        self._kinds = kinds
+        self._starts = starts
+        self._ins = ins
+        self._outs = outs
+        self._aux = aux
+
+        # the cells reading each net, grouped by net
+        fanStarts = array('i', [0]) * (netlist.nNets + 1)
+        for net in ins:
+            fanStarts[net + 1] += 1
+        for net in xrange(netlist.nNets):
+            fanStarts[net + 1] += fanStarts[net]
+        fanCells = array('i', [0]) * len(ins)
+        filled = array('i', fanStarts)
+        for cell in xrange(len(kinds)):
+            for k in xrange(starts[cell], starts[cell + 1]):
+                net = ins[k]
+                fanCells[filled[net]] = cell
+                filled[net] += 1
+        self._fanStarts = fanStarts
+        self._fanCells = fanCells
+
+        self._state = bytearray(netlist.nNets) + bytearray(netlist.latchInit)
+        # marks the cells waiting to be evaluated while an input change propagates
+        self._queued = bytearray(len(kinds))
+        for cell in xrange(len(kinds)):
+            self._evaluate(cell)
+
+    @property
+    def nInputs(self):
+        return self.netlist.nInputs
+
+    @property
+    def nOutputs(self):
+        return self.netlist.nOutputs
+
+    def _evaluate(self, cell):
+        """ Evaluate one cell, returning True if its outputs changed """
+        state = self._state
+        ins = self._ins
+        first = self._starts[cell]
+        kind = Circuit.KINDS[self._kinds[cell]]
+        if kind == AND:
+            value = state[ins[first]] & state[ins[first + 1]]
+        elif kind == OR:
+            value = state[ins[first]] | state[ins[first + 1]]
+        elif kind == XOR:
+            value = state[ins[first]] ^ state[ins[first + 1]]
+        elif kind == NOT:
+            value = 1 - state[ins[first]]
+        elif kind == LUT:
+            row = 0
+            for k in xrange(self._starts[cell + 1] - 1, first - 1, -1):
+                row = row << 1 | state[ins[k]]
+            value = (self._aux[cell] >> row) & 1
+        else:
+            slot, notQ = self._aux[cell]
+            state[slot], value = evaluateLatch(state[slot], state[ins[first]], state[ins[first + 1]], 1)
+            state[notQ] = 1 - value
+        out = self._outs[cell]
+        if state[out] == value:
+            return False
+        state[out] = value
+        return True
+
+    def _propagate(self, net):
+        """ Evaluate the cells reading net, then those reading any net which changes, level by level """
+        levels = self.netlist.levels
+        fanStarts = self._fanStarts
+        fanCells = self._fanCells
+        kinds = self._kinds
+        starts = self._starts
+        ins = self._ins
+        outs = self._outs
+        aux = self._aux
+        state = self._state
+        queued = self._queued
+        byLevel = {}
+        pending = []
+        changed = [net]
+        while True:
+            for net in changed:
+                for k in xrange(fanStarts[net], fanStarts[net + 1]):
+                    cell = fanCells[k]
+                    if not queued[cell]:
+                        queued[cell] = 1
+                        level = levels[cell]
+                        if level not in byLevel:
+                            byLevel[level] = [cell]
+                            heapq.heappush(pending, level)
+                        else:
+                            byLevel[level].append(cell)
+            if not pending:
+                return
+            # every cell of a level only reads nets of lower levels
+            changed = []
+            for cell in byLevel.pop(heapq.heappop(pending)):
+                queued[cell] = 0
+                kind = kinds[cell]
+                if kind <= _XOR_CODE:
+                    # AND, OR, NOT and XOR (the first four kinds) are evaluated here rather than by _evaluate()
+                    first = starts[cell]
+                    if kind == _NOT_CODE:
+                        value = 1 - state[ins[first]]
+                    elif kind == _AND_CODE:
+                        value = state[ins[first]] & state[ins[first + 1]]
+                    elif kind == _OR_CODE:
+                        value = state[ins[first]] | state[ins[first + 1]]
+                    else:
+                        value = state[ins[first]] ^ state[ins[first + 1]]
+                    out = outs[cell]
+                    if state[out] != value:
+                        state[out] = value
+                        changed.append(out)
+                elif kind == _LATCH_CODE:
+                    first = starts[cell]
+                    slot, notQ = aux[cell]
+                    state[slot], value = evaluateLatch(state[slot], state[ins[first]], state[ins[first + 1]], 1)
+                    out = outs[cell]
+                    if state[out] != value:
+                        state[out] = value
+                        state[notQ] = 1 - value
+                        changed.append(out)
+                        changed.append(notQ)
+                elif self._evaluate(cell):
+                    changed.append(outs[cell])
+
+    def _checkIndex(self, index, count, kind):
+        if not 0 <= index < count:
+            raise GateException("No %s pin %s on this circuit (%s)." % (kind, index, self.netlist.name))
+
+    def setIn(self, index, value):
+        """ Set the value of an input pin and propagate it """
+        self._checkIndex(index, self.nInputs, "input")
+        net = self.netlist.inputs[index]
+        value = 1 if value else 0
+        if self._state[net] != value:
+            self._state[net] = value
+            self._propagate(net)
+
+    def getIn(self, index):
+        self._checkIndex(index, self.nInputs, "input")
+        return bool(self._state[self.netlist.inputs[index]])
+
+    def getOut(self, index):
+        self._checkIndex(index, self.nOutputs, "output")
+        return bool(self._state[self.netlist.outputs[index]])
+
+    def snapshot(self):
+        """ Capture the whole state of the circuit. Pass the result to restore() to go back to it. """
+        return bytes(self._state)
+
+    def restore(self, snapshot):
+        if len(snapshot) != len(self._state):
+            raise GateException("Snapshot is %s bytes but this circuit (%s) has %s." % (len(snapshot), self.netlist.name, len(self._state)))
+        self._state[:] = snapshot
+
+    def fork(self):
+        """ An independent copy of this circuit, in the same state """
+        other = Circuit.__new__(Circuit)
+        other.__dict__.update(self.__dict__)
+        other._state = bytearray(self._state)
+        other._queued = bytearray(len(self._queued))
+        return other
+
+    def __str__(self):
+        return "%s<In=%s Out=%s>" % (self.netlist.name,
+            [self._state[net] for net in self.netlist.inputs],
+            [self._state[net] for net in self.netlist.outputs])
+
+    def __repr__(self):
+        return str(self)
+
+class NetlistGate(Gate):
+    """
+    The Gate API for a Netlist which wasn't built from Gate objects, such as an imported one.
+    A Circuit does the simulation. Pins are only made when getInPin() or getOutPin() asks
+    for them, so a netlist with a million nets doesn't need a million Pin objects. Setting
+    one of those input pins, or calling setIn(), updates the output pins made so far.
+    """
+    def __init__(self, netlist):
+        super(NetlistGate, self).__init__(0, 0)
+        self.netlist = netlist
+        self.circuit = Circuit(netlist)
+        self._inPins = {}
+        self._outPins = {}
+
+    @property
+    def nInputs(self):
+        return self.netlist.nInputs
+
+    @property
+    def nOutputs(self):
+        return self.netlist.nOutputs
+
+    @property
+    @overrides(Gate)
+    def hasState(self):
+        return self.netlist.nLatches > 0
+
+    @overrides(Gate)
+    def setIn(self, index, value):
+        if index in self._inPins:
+            self._inPins[index].value = value
+        else:
+            self.circuit.setIn(index, value)
+            self._refreshPins()
+
+    @overrides(Gate)
+    def getIn(self, index):
+        return self.circuit.getIn(index)
+
+    @overrides(Gate)
+    def getOut(self, index):
+        return self.circuit.getOut(index)
+
+    @overrides(Gate)
+    def getInPin(self, index):
+        if index not in self._inPins:
+            self.circuit._checkIndex(index, self.nInputs, "input")
+            pin = InputPin(self)
+            pin._value = self.circuit.getIn(index)
+            self._inPins[index] = pin
+        return self._inPins[index]
+
+    @overrides(Gate)
+    def getOutPin(self, index):
+        if index not in self._outPins:
+            self.circuit._checkIndex(index, self.nOutputs, "output")
+            pin = OutputPin()
+            pin._value = self.circuit.getOut(index)
+            self._outPins[index] = pin
+        return self._outPins[index]
+
+    @overrides(Gate)
+    def setInPin(self, index, pin):
+        raise GateException("The pins of a NetlistGate (%s) cannot be replaced." % self.netlist.name)
+
+    @overrides(Gate)
+    def setOutPin(self, index, pin):
+        raise GateException("The pins of a NetlistGate (%s) cannot be replaced." % self.netlist.name)
+
+    def _refreshPins(self):
+        for index, pin in self._outPins.items():
+            value = self.circuit.getOut(index)
+            if pin._value != value:
+                pin.value = value
+
+    @overrides(Gate)
+    def refreshOutputs(self):
+        circuit = self.circuit
+        for index, pin in self._inPins.items():
+            if circuit.getIn(index) != pin._value:
+                circuit.setIn(index, pin._value)
+        self._refreshPins()
+
+    @overrides(Gate)
+    def allPins(self):
+        return self._inPins.values() + self._outPins.values()
+
+    @overrides(Gate)
+    def snapshot(self):
+        return self.circuit.snapshot()
+
+    @overrides(Gate)
+    def restore(self, snapshot):
+        self.circuit.restore(snapshot)
+        for index, pin in self._inPins.items():
+            pin._value = self.circuit.getIn(index)
+        for index, pin in self._outPins.items():
+            pin._value = self.circuit.getOut(index)
+
+    def __str__(self):
+        return str(self.circuit)
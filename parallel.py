@@ -0,0 +1,237 @@
+"""
+Partitioned simulation of a Netlist across several processes.
+
+partition() splits the cells of a levelized Netlist into balanced parts made of whole fan-in
+cones where it can, so that few nets cross between parts.
+
+A ParallelSimulator runs each part in its own process. Net values live in one shared
+memory array of 64-bit words (bit j is the value for vector j of the batch, as in a
+Simulator). The processes evaluate their cells one level at a time and wait on a barrier
+after every level which produces a net another part reads.
+"""
+import ctypes
+import multiprocessing
+from multiprocessing.sharedctypes import RawArray, RawValue
+
+from gates import GateException
+from netlist import Simulator, evaluateCell
+
+WORD_BITS = 64
+
+class Partitioning(object):
+    """
+    An assignment of every cell of a netlist to one of nParts parts.
+        - owner[i] is the part cells[i] belongs to
+        - cutNets is the number of nets read by a part other than the one driving them
+        - syncLevels are the levels after which the parts have to wait for each other
+    """
+    def __init__(self, netlist, owner, nParts):
+        self.netlist = netlist
+        self.owner = owner
+        self.nParts = nParts
+
+        producer = {}
+        for i, cell in enumerate(netlist.cells):
+            for net in cell[2]:
+                producer[net] = i
+        cut = set()
+        for i, cell in enumerate(netlist.cells):
+            for net in cell[1]:
+                if net in producer and owner[producer[net]] != owner[i]:
+                    cut.add(net)
+        self.cutNets = len(cut)
+        self.syncLevels = set(netlist.levels[producer[net]] for net in cut)
+
+    @property
+    def sizes(self):
+        sizes = [0] * self.nParts
+        for part in self.owner:
+            sizes[part] += 1
+        return sizes
+
+    def plan(self, part):
+        """ The cells of one part grouped by level: plan[level - 1] is a list of cells """
+        netlist = self.netlist
+        plan = [[] for level in xrange(netlist.depth)]
+        for i, cell in enumerate(netlist.cells):
+            if self.owner[i] == part:
+                plan[netlist.levels[i] - 1].append(cell)
+        return plan
+
+    def __str__(self):
+        return "Partitioning<parts=%s sizes=%s cut=%s barriers=%s>" % (
+            self.nParts, self.sizes, self.cutNets, len(self.syncLevels))
+
+    def __repr__(self):
+        return str(self)
+
+def coneOrder(netlist, driver):
+    """
+    The cells of a netlist in depth-first order from its outputs (and then from any cells no
+    output depends on), each cell after the cells driving it. The cells of a fan-in cone
+    which isn't shared with the cells before it come out next to each other.
+    """
+    cells = netlist.cells
+    seen = [False] * len(cells)
+    order = []
+    roots = [driver[net] for net in netlist.outputs if net in driver] + range(len(cells))
+    for root in roots:
+        if seen[root]:
+            continue
+        seen[root] = True
+        stack = [(root, iter(cells[root][1]))]
+        while stack:
+            i, inputs = stack[-1]
+            for net in inputs:
+                j = driver.get(net)
+                if j is not None and not seen[j]:
+                    seen[j] = True
+                    stack.append((j, iter(cells[j][1])))
+                    break
+            else:
+                stack.pop()
+                order.append(i)
+    return order
+
+def partition(netlist, nParts, grain = 8):
+    """
+    Greedily partition a netlist.
+
+    Parts are grown from fan-in cones: the cells are put in depth-first order from the
+    outputs (see coneOrder()), which is cut into nParts runs of the same length. A mux tree
+    is split into subtrees and an adder into ranges of bits.
+
+    A level of fewer than grain cells is cheaper to evaluate in one part than to split, so
+    all of its cells then go to the part which has most of them and drives most of their
+    inputs.
+    """
+    cells = netlist.cells
+    driver = {}
+    for i, cell in enumerate(cells):
+        for net in cell[2]:
+            driver[net] = i
+
+    owner = [0] * len(cells)
+    for k, i in enumerate(coneOrder(netlist, driver)):
+        owner[i] = k * nParts // len(cells)
+
+    byLevel = {}
+    for i, level in enumerate(netlist.levels):
+        byLevel.setdefault(level, []).append(i)
+    for level in sorted(byLevel):
+        indices = byLevel[level]
+        if len(indices) >= grain:
+            continue
+        # inputs count double: keeping them in the part is what saves a cut net
+        votes = [0] * nParts
+        for i in indices:
+            votes[owner[i]] += 1
+            for net in cells[i][1]:
+                if net in driver:
+                    votes[owner[driver[net]]] += 2
+        best = max(xrange(nParts), key=lambda p: (votes[p], -p))
+        for i in indices:
+            owner[i] = best
+    return Partitioning(netlist, owner, nParts)
+
+class _Barrier(object):
+    """ A reusable barrier for a fixed number of processes """
+    def __init__(self, parties):
+        self.parties = parties
+        self._cond = multiprocessing.Condition(multiprocessing.Lock())
+        self._count = RawValue(ctypes.c_int, 0)
+        self._generation = RawValue(ctypes.c_int, 0)
+
+    def wait(self):
+        if self.parties == 1:
+            return
+        with self._cond:
+            generation = self._generation.value
+            self._count.value += 1
+            if self._count.value == self.parties:
+                self._count.value = 0
+                self._generation.value += 1
+                self._cond.notify_all()
+            else:
+                while generation == self._generation.value:
+                    self._cond.wait()
+
+def _runPart(plan, syncLevels, values, state, control, levelBarrier):
+    """ Evaluate one batch for one part """
+    width = control[0]
+    mask = (1 << width) - 1
+    for level, cells in enumerate(plan, 1):
+        for cell in cells:
+            evaluateCell(cell, values, state, width, mask)
+        if level in syncLevels:
+            levelBarrier.wait()
+
+def _worker(plan, syncLevels, values, state, control, start, levelBarrier, done):
+    while True:
+        start.wait()
+        if control[1]:
+            return
+        _runPart(plan, syncLevels, values, state, control, levelBarrier)
+        done.wait()
+
+class ParallelSimulator(Simulator):
+    """
+    Evaluates a Netlist with one process per part of a Partitioning.
+    The calling process simulates part 0 itself. Batches are at most 64 vectors wide.
+
+    Call close() (or use a with statement) to stop the worker processes.
+    """
+    def __init__(self, netlist, nProcesses = None, partitioning = None):
+        super(ParallelSimulator, self).__init__(netlist, WORD_BITS)
+        if partitioning is None:
+            partitioning = partition(netlist, nProcesses or multiprocessing.cpu_count())
+        self.partitioning = partitioning
+        nParts = partitioning.nParts
+
+        self.values = RawArray(ctypes.c_uint64, netlist.nNets)
+        self.state = RawArray(ctypes.c_ubyte, self.state)
+        # control[0] is the batch width, control[1] tells the workers to stop
+        self.control = RawArray(ctypes.c_uint64, 2)
+        self._start = _Barrier(nParts)
+        self._levelBarrier = _Barrier(nParts)
+        self._done = _Barrier(nParts)
+
+        syncLevels = partitioning.syncLevels
+        self._plan = partitioning.plan(0)
+        self._syncLevels = syncLevels
+        self._workers = []
+        for part in xrange(1, nParts):
+            worker = multiprocessing.Process(target=_worker, args=(
+                partitioning.plan(part), syncLevels, self.values, self.state, self.control,
+                self._start, self._levelBarrier, self._done))
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+    def evaluate(self, inWords, width):
+        if width > WORD_BITS:
+            raise GateException("A ParallelSimulator batch is at most %s vectors (got %s)" % (WORD_BITS, width))
+        if self.control[1]:
+            raise GateException("This ParallelSimulator is closed")
+        values = self.values
+        for net, word in zip(self.netlist.inputs, inWords):
+            values[net] = word
+        self.control[0] = width
+        self._start.wait()
+        _runPart(self._plan, self._syncLevels, values, self.state, self.control, self._levelBarrier)
+        self._done.wait()
+        return values[:]
+
+    def close(self):
+        if self.control[1]:
+            return
+        self.control[1] = 1
+        self._start.wait()
+        for worker in self._workers:
+            worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excInfo):
+        self.close()
@@ -0,0 +1,265 @@
+"""
+Breadth-first exploration of the reachable states of a sequential netlist.
+
+A state is the contents of every latch packed into an integer: bit i is the Q of latch i
+(in the netlist's latch order). Each step of the search takes a batch of frontier states
+and applies every input vector of the alphabet to all of them at once. Lane
+b * len(alphabet) + x of every word is state b with input vector x, and the lanes are
+evaluated by generated code in which every lane has its own latch state (see
+netlist.generateSource()).
+
+An SR latch whose inputs are both high may end up either way, so both outcomes count as
+reachable.
+"""
+import time
+from array import array
+from itertools import izip
+
+from gates import GateException, cross
+from netlist import LANES, generateSource, compileSource
+
+# up to this many latches the visited states are a table indexed by state (at most 16MB)
+TABLE_LATCHES = 22
+
+# above this many latches racing at once, trying every outcome is too expensive
+MAX_RACING_LATCHES = 12
+
+class VisitedStates(object):
+    """
+    The states found so far, each with the number it was given when it was found: a table
+    indexed by state when the state space is small enough, a dict otherwise.
+    """
+    def __init__(self, nLatches):
+        self._table = None
+        self._numbers = None
+        if nLatches <= TABLE_LATCHES:
+            # the number plus one, so that 0 means not found
+            self._table = array('I', [0]) * (1 << nLatches)
+        else:
+            self._numbers = {}
+
+    def add(self, state, number):
+        """ Add a state, returning True if it wasn't there already """
+        table = self._table
+        if table is not None:
+            if table[state]:
+                return False
+            table[state] = number + 1
+            return True
+        if state in self._numbers:
+            return False
+        self._numbers[state] = number
+        return True
+
+    def number(self, state):
+        """ The number given to a state, or None if it wasn't found """
+        table = self._table
+        if table is not None:
+            if 0 <= state < len(table) and table[state]:
+                return table[state] - 1
+            return None
+        return self._numbers.get(state)
+
+    def __contains__(self, state):
+        return self.number(state) is not None
+
+def packState(latches):
+    """ Pack a list of latch values into a state """
+    state = 0
+    for i, q in enumerate(latches):
+        if q:
+            state |= 1 << i
+    return state
+
+class StateSpace(object):
+    """
+    The states of a netlist reachable from its initial latch state.
+
+    The alphabet is the list of input vectors to try in every state; by default it is every
+    possible input vector. After explore():
+        - layers[d] holds the states first reached after d steps (layers[0] is the initial state)
+        - parents[d][i] is p * len(alphabet) + x when input vector x takes layers[d - 1][p]
+          to layers[d][i], so trace() can follow a state back without searching
+        - visited numbers every state found, in the order of the layers
+        - transitions is the number of (state, input vector) pairs evaluated
+        - seconds is how long exploring took
+        - complete is False if there are more than maxStates states, and only maxStates were kept
+    """
+    def __init__(self, netlist, alphabet = None, batchLanes = 4096):
+        if alphabet is None:
+            if netlist.nInputs > 16:
+                raise GateException("%s has %s inputs; pass an alphabet of input vectors to try." % (netlist.name, netlist.nInputs))
+            if netlist.nInputs == 0:
+                alphabet = [()]
+            else:
+                alphabet = [tuple(vector) for vector in cross([0, 1], netlist.nInputs)]
+        for vector in alphabet:
+            if len(vector) != netlist.nInputs:
+                raise GateException("%s has %s inputs but an input vector has %s." % (netlist.name, netlist.nInputs, len(vector)))
+        self.netlist = netlist
+        self.alphabet = alphabet
+        self.statesPerBatch = max(1, batchLanes // len(alphabet))
+        self._evaluate = compileSource(generateSource(netlist, LANES), netlist)
+        self._patterns = [packState([vector[i] for vector in alphabet]) for i in xrange(netlist.nInputs)]
+
+        self.layers = []
+        self.parents = []
+        self.visited = None
+        self.transitions = 0
+        self.seconds = 0.0
+        self.complete = False
+
+    @property
+    def nStates(self):
+        return sum(len(layer) for layer in self.layers)
+
+    @property
+    def depth(self):
+        """ The number of steps needed to reach every reachable state """
+        return len(self.layers) - 1
+
+    @property
+    def rate(self):
+        """ Transitions evaluated per second """
+        return self.transitions / max(self.seconds, 1e-9)
+
+    def _newLayer(self, states = ()):
+        if self.netlist.nLatches <= 64:
+            return array('L', states)
+        return list(states)
+
+    def _locate(self, number):
+        """ The layer of the state with the given number, and its index in that layer """
+        for depth, layer in enumerate(self.layers):
+            if number < len(layer):
+                return depth, number
+            number -= len(layer)
+        raise IndexError("state number out of range")
+
+    def _unpack(self, words, width):
+        """ The state in every lane, given one word per latch """
+        if not words:
+            return [0] * width
+        fmt = '0%db' % width
+        # one binary string per latch, most significant latch first, so each column is a lane's state
+        columns = [int(''.join(bits), 2) for bits in izip(*[format(word, fmt) for word in reversed(words)])]
+        columns.reverse()
+        return columns
+
+    def successors(self, states):
+        """
+        Apply every input vector of the alphabet to every one of the given states.
+        Returns the successor in each lane, lane b * len(alphabet) + x being state b with
+        input vector x. If any latches raced, the lanes are repeated for each outcome.
+        """
+        nLatches = self.netlist.nLatches
+        nVectors = len(self.alphabet)
+        width = len(states) * nVectors
+        mask = (1 << width) - 1
+        every = int(('0' * (nVectors - 1) + '1') * len(states), 2)
+        inWords = [pattern * every for pattern in self._patterns]
+        ones = '1' * nVectors
+        zeroes = '0' * nVectors
+        startWords = [int(''.join([ones if (state >> i) & 1 else zeroes for state in reversed(states)]), 2)
+                      for i in xrange(nLatches)]
+
+        results = []
+        racing = 0
+        tried = set()
+        pending = [0]
+        while pending:
+            outcome = pending.pop()
+            tried.add(outcome)
+            words = list(startWords)
+            races = [0] * nLatches
+            choices = [mask if (outcome >> i) & 1 else 0 for i in xrange(nLatches)]
+            self._evaluate(inWords, words, width, mask, choices, races)
+            results.extend(self._unpack(words, width))
+
+            for i, word in enumerate(races):
+                if word:
+                    racing |= 1 << i
+            if bin(racing).count('1') > MAX_RACING_LATCHES:
+                raise GateException("More than %s latches race in %s." % (MAX_RACING_LATCHES, self.netlist.name))
+            # try every combination of outcomes for the latches that have raced so far
+            combination = racing
+            while True:
+                if combination not in tried and combination not in pending:
+                    pending.append(combination)
+                if combination == 0:
+                    break
+                combination = (combination - 1) & racing
+        return results
+
+    def explore(self, maxStates = None):
+        """ Find every reachable state (or the first maxStates of them) """
+        start = time.time()
+        nVectors = len(self.alphabet)
+        visited = self.visited = VisitedStates(self.netlist.nLatches)
+        initial = packState(self.netlist.latchInit)
+        visited.add(initial, 0)
+        self.layers = [self._newLayer([initial])]
+        self.parents = [array('L', [0])]
+        self.transitions = 0
+        self.complete = True
+        nStates = 1
+
+        frontier = self.layers[0]
+        while frontier:
+            layer = self._newLayer()
+            parents = array('L')
+            for first in xrange(0, len(frontier), self.statesPerBatch):
+                successors = self.successors(frontier[first:first + self.statesPerBatch])
+                self.transitions += len(successors)
+                width = min(self.statesPerBatch, len(frontier) - first) * nVectors
+                for lane, state in enumerate(successors):
+                    if visited.add(state, nStates + len(layer)):
+                        if maxStates is not None and nStates + len(layer) >= maxStates:
+                            # a new state which doesn't fit, so there are more than maxStates
+                            self.complete = False
+                            break
+                        layer.append(state)
+                        parents.append(first * nVectors + lane % width)
+                if not self.complete:
+                    break
+            if layer:
+                self.layers.append(layer)
+                self.parents.append(parents)
+                nStates += len(layer)
+            if not self.complete:
+                break
+            frontier = layer
+        self.seconds = time.time() - start
+        return self
+
+    def __contains__(self, state):
+        if self.visited is None:
+            return False
+        # the state which didn't fit under maxStates was numbered, but isn't in a layer
+        number = self.visited.number(state)
+        return number is not None and number < self.nStates
+
+    def trace(self, target):
+        """ A shortest list of input vectors which takes the netlist from its initial state to target """
+        if target not in self:
+            raise GateException("State %s of %s was not reached." % (target, self.netlist.name))
+        nVectors = len(self.alphabet)
+        depth, index = self._locate(self.visited.number(target))
+        path = []
+        for d in xrange(depth, 0, -1):
+            index, x = divmod(self.parents[d][index], nVectors)
+            path.append(self.alphabet[x])
+        path.reverse()
+        return path
+
+    def __str__(self):
+        return "StateSpace<%s states=%s depth=%s transitions=%s rate=%.0f/sec%s>" % (
+            self.netlist.name, self.nStates, self.depth, self.transitions, self.rate,
+            "" if self.complete else " incomplete")
+
+    def __repr__(self):
+        return str(self)
+
+def explore(netlist, alphabet = None, maxStates = None):
+    """ Explore the reachable states of a netlist. Returns the StateSpace. """
+    return StateSpace(netlist, alphabet).explore(maxStates)
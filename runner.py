@@ -0,0 +1,258 @@
+"""
+Run a gate from gates.py over a file of input vectors, writing one output vector per input vector.
+
+    python runner.py FourBitAdder vectors.txt results.txt
+    python runner.py NBitAdder --arg 32 vectors.bin results.bin --expected expected.bin
+
+Vector files come in two formats:
+    - text: one vector per line, one character ('0' or '1') per pin, In0 first
+    - binary (files ending in .bin, or --format binary): each vector takes (pins + 7) // 8
+      bytes, with pin i in bit i % 8 of byte i // 8
+The results are written in the same format as the input, and an expected-results file has to
+be in that format too.
+
+The files are streamed a chunk of vectors at a time (binary files are mapped with mmap), so
+memory use doesn't grow with the size of the files. Each chunk is evaluated as one batch by a
+CompiledSimulator, which keeps the latch state from one chunk to the next. Gates which cannot
+be flattened into a Netlist (word-level and memoized gates) are simulated with the Gate
+objects instead, one vector at a time. With --cache, the compiled circuit is kept in a
+CircuitCache (see circuitcache.py) for the next run.
+"""
+import argparse
+import mmap
+import os
+import sys
+import time
+from itertools import islice
+
+import gates
+from gates import Gate, GateException
+from netlist import flatten, CompiledSimulator
+from lutmap import mapLuts
+from circuitcache import CircuitCache
+
+TEXT = 'text'
+BINARY = 'binary'
+
+# the bits of every byte value as a string, least significant first, and back again
+BYTE_BITS = [format(byte, '08b')[::-1] for byte in xrange(256)]
+BITS_BYTE = dict((bits, chr(byte)) for byte, bits in enumerate(BYTE_BITS))
+
+class TextVectors(object):
+    """ Reads or writes vectors as lines of '0' and '1' characters """
+    def __init__(self, path, nBits, write = False):
+        self.nBits = nBits
+        self._file = open(path, 'w' if write else 'r')
+        self._line = 0
+
+    def read(self, count):
+        """ The next count vectors (fewer at the end of the file) as strings, In0 first """
+        rows = []
+        for line in islice(self._file, count):
+            self._line += 1
+            row = line.strip()
+            if len(row) != self.nBits or row.strip('01'):
+                raise GateException("Line %s of %s is not a %s-bit vector: %r" % (self._line, self._file.name, self.nBits, row))
+            rows.append(row)
+        return rows
+
+    def write(self, rows):
+        self._file.write('\n'.join(rows))
+        self._file.write('\n')
+
+    def close(self):
+        self._file.close()
+
+class BinaryVectors(object):
+    """ Reads or writes vectors packed into (nBits + 7) // 8 bytes each """
+    def __init__(self, path, nBits, write = False):
+        self.nBits = nBits
+        self.recordSize = (nBits + 7) // 8
+        self._path = path
+        self._offset = 0
+        self._map = None
+        if write:
+            self._file = open(path, 'wb')
+            return
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        if size % self.recordSize:
+            raise GateException("%s is not a whole number of %s-byte vectors." % (path, self.recordSize))
+        if size:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def read(self, count):
+        if self._map is None:
+            return []
+        data = self._map[self._offset:self._offset + count * self.recordSize]
+        self._offset += len(data)
+        bits = ''.join([BYTE_BITS[byte] for byte in bytearray(data)])
+        step = self.recordSize * 8
+        return [bits[start:start + self.nBits] for start in xrange(0, len(bits), step)]
+
+    def write(self, rows):
+        padding = '0' * (self.recordSize * 8 - self.nBits)
+        bits = padding.join(rows) + padding
+        self._file.write(''.join([BITS_BYTE[bits[start:start + 8]] for start in xrange(0, len(bits), 8)]))
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+FORMATS = {TEXT: TextVectors, BINARY: BinaryVectors}
+
+class NetlistEvaluator(object):
+    """ Evaluates chunks of vectors as batches on a CompiledSimulator """
+    def __init__(self, netlist, codes = None):
+        self.netlist = netlist
+        self.nInputs = netlist.nInputs
+        self.nOutputs = netlist.nOutputs
+        self.simulator = CompiledSimulator(netlist, codes=codes)
+        self.name = "CompiledSimulator on %s" % netlist
+
+    def evaluate(self, rows):
+        width = len(rows)
+        # column i of the rows is input i for every vector; the first vector is bit 0 of its word
+        inWords = [int(''.join(column)[::-1], 2) for column in zip(*rows)]
+        outWords = self.simulator.evaluateOutputs(inWords, width)
+        if not outWords:
+            return [''] * width
+        fmt = '0%db' % width
+        return [''.join(bits) for bits in zip(*[format(word, fmt)[::-1] for word in outWords])]
+
+class GateEvaluator(object):
+    """ Sets the pins of the Gate object itself (with Gate.setInputs()), one vector at a time """
+    def __init__(self, gate):
+        self.gate = gate
+        self.nInputs = gate.nInputs
+        self.nOutputs = gate.nOutputs
+        self.name = "%s objects" % gate.__class__.__name__
+
+    def evaluate(self, rows):
+        gate = self.gate
+        indices = range(gate.nInputs)
+        results = []
+        for row in rows:
+            gate.setInputs(indices, [bit == '1' for bit in row])
+            results.append(''.join(['1' if gate.getOutPin(i).value else '0' for i in xrange(gate.nOutputs)]))
+        return results
+
+def gateClass(name):
+    """ The gate class called name in gates.py """
+    cls = getattr(gates, name, None)
+    if not (isinstance(cls, type) and issubclass(cls, Gate)):
+        raise GateException("gates.py has no gate called %s." % name)
+    return cls
+
+def makeGate(cls, args):
+    try:
+        return cls(*args)
+    except TypeError as e:
+        raise GateException("Cannot construct %s%s: %s" % (cls.__name__, tuple(args), e))
+
+def makeEvaluator(name, args, lutInputs = None, cache = None):
+    """ The fastest way there is to evaluate the named gate, taking it from a CircuitCache if given """
+    cls = gateClass(name)
+    gate = makeGate(cls, args)
+    if cache is not None:
+        try:
+            netlist, codes = cache.compiled(cls, args, lutInputs)
+            return NetlistEvaluator(netlist, codes)
+        except GateException:
+            # it can't be flattened, so it can't be cached either
+            pass
+    try:
+        netlist = flatten(gate)
+    except GateException:
+        return GateEvaluator(gate)
+    if lutInputs:
+        netlist = mapLuts(netlist, lutInputs)
+    return NetlistEvaluator(netlist)
+
+class RunReport(object):
+    """ What run() did: how many vectors, how fast and how many differed from the expected results """
+    def __init__(self, evaluator):
+        self.evaluator = evaluator
+        self.nVectors = 0
+        self.seconds = 0.0
+        self.compared = False
+        self.mismatches = 0
+        self.firstMismatches = []
+
+    @property
+    def rate(self):
+        return self.nVectors / max(self.seconds, 1e-9)
+
+    def __str__(self):
+        lines = ["%s vectors in %.3f sec (%.0f vectors/sec) with %s" % (
+            self.nVectors, self.seconds, self.rate, self.evaluator.name)]
+        if self.compared:
+            lines.append("%s mismatches with the expected results" % self.mismatches)
+            for index, expected, got in self.firstMismatches:
+                lines.append("  vector %s: expected %s, got %s" % (index, expected, got))
+        return '\n'.join(lines)
+
+def run(evaluator, inputs, outputs, expected = None, chunkSize = 4096, maxReported = 10):
+    """
+    Stream every vector from inputs through the evaluator to outputs, a chunk at a time,
+    comparing with expected (if given) as it goes. Returns a RunReport.
+    """
+    report = RunReport(evaluator)
+    report.compared = expected is not None
+    start = time.time()
+    while True:
+        rows = inputs.read(chunkSize)
+        if not rows:
+            break
+        results = evaluator.evaluate(rows)
+        outputs.write(results)
+        if expected is not None:
+            wanted = expected.read(len(rows))
+            if len(wanted) < len(rows):
+                raise GateException("The expected results end after %s vectors." % (report.nVectors + len(wanted)))
+            for i, (want, got) in enumerate(zip(wanted, results)):
+                if want != got:
+                    report.mismatches += 1
+                    if len(report.firstMismatches) < maxReported:
+                        report.firstMismatches.append((report.nVectors + i, want, got))
+        report.nVectors += len(rows)
+    if expected is not None and expected.read(1):
+        raise GateException("The expected results have more than %s vectors." % report.nVectors)
+    report.seconds = time.time() - start
+    return report
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Simulate a gate from gates.py over a file of input vectors.")
+    parser.add_argument('gate', help="the name of a Gate class in gates.py")
+    parser.add_argument('inputs', help="the input vectors")
+    parser.add_argument('outputs', help="where to write the output vectors")
+    parser.add_argument('--arg', type=int, action='append', default=[], help="an integer argument for the gate's constructor (repeat for more)")
+    parser.add_argument('--format', choices=sorted(FORMATS), help="the file format (binary for .bin files, otherwise text)")
+    parser.add_argument('--expected', help="compare the outputs with this file of expected output vectors")
+    parser.add_argument('--chunk', type=int, default=4096, help="vectors per batch")
+    parser.add_argument('--lut', type=int, help="map the netlist onto LUTs with this many inputs first (to check a mapping: batches run faster without)")
+    parser.add_argument('--cache', nargs='?', const='', help="keep the compiled circuit in a CircuitCache (in this directory, or the default one)")
+    options = parser.parse_args(argv)
+
+    fmt = options.format or (BINARY if options.inputs.endswith('.bin') else TEXT)
+    try:
+        cache = CircuitCache(options.cache or None) if options.cache is not None else None
+        evaluator = makeEvaluator(options.gate, options.arg, options.lut, cache)
+        inputs = FORMATS[fmt](options.inputs, evaluator.nInputs)
+        outputs = FORMATS[fmt](options.outputs, evaluator.nOutputs, write=True)
+        expected = FORMATS[fmt](options.expected, evaluator.nOutputs) if options.expected else None
+        try:
+            report = run(evaluator, inputs, outputs, expected, options.chunk)
+        finally:
+            for vectors in (inputs, outputs, expected):
+                if vectors is not None:
+                    vectors.close()
+    except (GateException, IOError) as e:
+        print >> sys.stderr, "error:", e
+        return 2
+    print report
+    return 1 if report.mismatches else 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
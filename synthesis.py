@@ -0,0 +1,307 @@
+"""
+Synthesis of gates from truth tables.
+
+synthesize() takes the truth table of a function of n inputs (or a Python function to
+build one from) and makes a Gate subclass out of And, Or, Not and Fan gates:
+
+    Decoder = synthesize(lambda a0, a1: [a0 + 2 * a1 == k for k in range(4)], 2, 'Decoder')
+    Decoder().setIn(1, True)
+
+Each output is minimized as a sum of products with the Quine-McCluskey method: the prime
+implicants are found by merging minterms which differ in one input, and a cover is chosen
+from them, essential primes first and then greedily (as Espresso does, rather than
+searching for the smallest cover). The outputs share their work: when the greedy choice is
+a tie, a product another output already uses wins, and identical products and partial
+products are built once. Every input has at most one Not.
+
+Rows of the truth table may be None for "don't care", which leaves the minimizer free to
+choose.
+"""
+from gates import Gate, GateException, And, Or, Not, Xor, Fan, SRLatch, overrides
+
+PRIMITIVE_GATES = (And, Or, Not, Xor, Fan, SRLatch)
+
+def truthTable(function, nInputs):
+    """
+    The truth table of a Python function of nInputs bits (In0 first), as a list of rows of
+    output values: row r holds the outputs when input i is bit i of r. The function returns
+    one value (for one output) or a sequence of them; None means "don't care".
+    """
+    table = []
+    for row in xrange(1 << nInputs):
+        outputs = function(*[(row >> i) & 1 for i in xrange(nInputs)])
+        if not isinstance(outputs, (list, tuple)):
+            outputs = (outputs,)
+        table.append(tuple(outputs))
+    return table
+
+def primeImplicants(ones, dontCares, nInputs):
+    """
+    The prime implicants of a function with the given minterms and don't-care rows.
+    An implicant is a pair (bits, mask): the inputs in mask can be anything, and the other
+    inputs have the values in bits.
+    """
+    current = set((row, 0) for row in set(ones) | set(dontCares))
+    primes = set()
+    while current:
+        merged = set()
+        used = set()
+        # implicants can only merge with others that have the same mask
+        byMask = {}
+        for implicant in current:
+            byMask.setdefault(implicant[1], []).append(implicant)
+        for mask, group in byMask.items():
+            members = set(bits for bits, m in group)
+            for bits in members:
+                for i in xrange(nInputs):
+                    bit = 1 << i
+                    if mask & bit or bits & bit:
+                        continue
+                    if bits | bit in members:
+                        merged.add((bits, mask | bit))
+                        used.add((bits, mask))
+                        used.add((bits | bit, mask))
+        primes.update(current - used)
+        current = merged
+    return primes
+
+def covers(implicant, row):
+    bits, mask = implicant
+    return row & ~mask == bits
+
+def chooseCover(ones, primes, shared):
+    """
+    Choose primes covering every minterm: the essential ones, then greedily the one covering
+    the most minterms left, preferring primes in shared and then those with fewer inputs.
+    """
+    left = set(ones)
+    coveredBy = dict((row, [p for p in primes if covers(p, row)]) for row in left)
+    cover = []
+    for row in sorted(left):
+        if len(coveredBy[row]) == 1 and coveredBy[row][0] not in cover:
+            cover.append(coveredBy[row][0])
+    for prime in cover:
+        left -= set(row for row in left if covers(prime, row))
+    while left:
+        def gain(prime):
+            count = sum(1 for row in left if covers(prime, row))
+            return (count, prime in shared, bin(prime[1]).count('1'), prime)
+        best = max(primes, key=gain)
+        cover.append(best)
+        left -= set(row for row in left if covers(best, row))
+    return sorted(cover, key=lambda (bits, mask): (-bin(mask).count('1'), bits, mask))
+
+def minimize(table, nInputs):
+    """ A cover of prime implicants for every output of a truth table """
+    nOutputs = len(table[0])
+    shared = set()
+    result = []
+    for j in xrange(nOutputs):
+        ones = [row for row in xrange(1 << nInputs) if table[row][j] is not None and table[row][j]]
+        dontCares = [row for row in xrange(1 << nInputs) if table[row][j] is None]
+        cover = chooseCover(ones, primeImplicants(ones, dontCares, nInputs), shared)
+        shared.update(cover)
+        result.append(cover)
+    return result
+
+def expression(cover, nInputs):
+    """ A cover written out as a sum of products, like "In0 & !In1 | In2" """
+    if not cover:
+        return "0"
+    terms = []
+    for bits, mask in cover:
+        literals = [("In%s" if (bits >> i) & 1 else "!In%s") % i for i in xrange(nInputs) if not (mask >> i) & 1]
+        terms.append(" & ".join(literals) or "1")
+    return " | ".join(terms)
+
+class Network(object):
+    """
+    Two-input gates built with structural hashing, so each distinct gate is only made once.
+    A signal is ('in', i) for input i or ('gate', k) for the output of gates[k].
+    """
+    def __init__(self):
+        self.gates = []
+        self._made = {}
+
+    def gate(self, kind, inputs):
+        if kind != 'not':
+            inputs = tuple(sorted(inputs))
+        key = (kind, inputs)
+        if key not in self._made:
+            self.gates.append(key)
+            self._made[key] = ('gate', len(self.gates) - 1)
+        return self._made[key]
+
+    def tree(self, kind, signals):
+        """ A balanced tree of gates combining the signals """
+        if len(signals) == 1:
+            return signals[0]
+        half = len(signals) // 2
+        return self.gate(kind, (self.tree(kind, signals[:half]), self.tree(kind, signals[half:])))
+
+    def literal(self, i, value):
+        if value:
+            return ('in', i)
+        return self.gate('not', (('in', i),))
+
+    def product(self, implicant, nInputs):
+        bits, mask = implicant
+        literals = [self.literal(i, (bits >> i) & 1) for i in xrange(nInputs) if not (mask >> i) & 1]
+        if not literals:
+            return self.constant(True)
+        return self.tree('and', literals)
+
+    def constant(self, value):
+        """ Always 1 (In0 | !In0) or always 0 (In0 & !In0) """
+        return self.gate('or' if value else 'and', (self.literal(0, True), self.literal(0, False)))
+
+    def sumOfProducts(self, cover, nInputs):
+        if not cover:
+            return self.constant(False)
+        return self.tree('or', [self.product(implicant, nInputs) for implicant in cover])
+
+def wire(network, outputs, nInputs):
+    """
+    Turn a network into the steps for building it out of gates:
+        - parts: (attribute, class name, constructor arguments)
+        - inPins: (input index, attribute, pin index) for setInPin()
+        - connections: (attribute, output index, attribute, input index) for addConnection()
+        - outPins: (output index, attribute, pin index) for setOutPin()
+    Inputs which drive more than one pin go through a Fan.
+    """
+    names = {'and': 'And', 'or': 'Or', 'not': 'Not'}
+    counts = {}
+    parts = []
+    def newPart(className, args = ()):
+        counts[className] = counts.get(className, 0) + 1
+        attribute = "%s%s" % (className.lower(), counts[className])
+        parts.append((attribute, className, args))
+        return attribute
+
+    gateParts = [newPart(names[kind]) for kind, inputs in network.gates]
+    sinks = {}
+    for k, (kind, inputs) in enumerate(network.gates):
+        for pin, signal in enumerate(inputs):
+            sinks.setdefault(signal, []).append((gateParts[k], pin))
+
+    inPins = []
+    connections = []
+    outPins = []
+    inputTaps = {}
+    for i in xrange(nInputs):
+        pins = sinks.get(('in', i), [])
+        nTaps = sum(1 for signal in outputs if signal == ('in', i))
+        if len(pins) + nTaps == 1 and not nTaps:
+            inPins.append((i, pins[0][0], pins[0][1]))
+        elif pins or nTaps:
+            fan = newPart('Fan', (len(pins) + nTaps,))
+            inPins.append((i, fan, 0))
+            for j, (part, pin) in enumerate(pins):
+                connections.append((fan, j, part, pin))
+            inputTaps[i] = [(fan, j) for j in xrange(len(pins), len(pins) + nTaps)]
+    for k in xrange(len(network.gates)):
+        for part, pin in sinks.get(('gate', k), []):
+            connections.append((gateParts[k], 0, part, pin))
+    for j, (kind, index) in enumerate(outputs):
+        if kind == 'in':
+            part, pin = inputTaps[index].pop()
+        else:
+            part, pin = gateParts[index], 0
+        outPins.append((j, part, pin))
+    # the fans are made first, as in gates.py
+    parts.sort(key=lambda part: part[1] != 'Fan')
+    return parts, inPins, connections, outPins
+
+class SynthesizedGate(Gate):
+    """
+    The base class of the gates made by synthesize(). WIRING holds the steps from wire() and
+    EXPRESSIONS the sum of products for each output.
+    """
+    N_INPUTS = 0
+    N_OUTPUTS = 0
+    WIRING = ((), (), (), ())
+    EXPRESSIONS = ()
+
+    def __init__(self):
+        super(SynthesizedGate, self).__init__(self.N_INPUTS, self.N_OUTPUTS)
+        classes = {'And': And, 'Or': Or, 'Not': Not, 'Fan': Fan}
+        parts, inPins, connections, outPins = self.WIRING
+        for attribute, className, args in parts:
+            setattr(self, attribute, classes[className](*args))
+        for i, part, pin in inPins:
+            self.setInPin(i, getattr(self, part).getInPin(pin))
+        for source, out, sink, pin in connections:
+            getattr(self, source).getOutPin(out).addConnection(getattr(self, sink).getInPin(pin))
+        for j, part, pin in outPins:
+            self.setOutPin(j, getattr(self, part).getOutPin(pin))
+
+    @overrides(Gate)
+    def refreshOutputs(self):
+        # only called for an input which no output depends on
+        pass
+
+def synthesize(function, nInputs, name = 'SynthesizedGate'):
+    """
+    Make a Gate subclass called name computing a function of nInputs inputs, given as a
+    truth table (see truthTable()) or a Python function of the input bits.
+    """
+    if nInputs < 1:
+        raise GateException("A synthesized gate needs at least one input (got %s)." % nInputs)
+    table = function if isinstance(function, (list, tuple)) else truthTable(function, nInputs)
+    if len(table) != 1 << nInputs:
+        raise GateException("A truth table for %s inputs has %s rows (got %s)." % (nInputs, 1 << nInputs, len(table)))
+    nOutputs = len(table[0])
+    if any(len(row) != nOutputs for row in table):
+        raise GateException("Every row of the truth table needs %s outputs." % nOutputs)
+
+    cover = minimize(table, nInputs)
+    network = Network()
+    outputs = [network.sumOfProducts(c, nInputs) for c in cover]
+    expressions = tuple("Out%s = %s" % (j, expression(c, nInputs)) for j, c in enumerate(cover))
+    return type(name, (SynthesizedGate,), {
+        '__doc__': "\n".join(("", "Synthesized from a truth table:") + tuple("    " + e for e in expressions) + ("",)),
+        'N_INPUTS': nInputs,
+        'N_OUTPUTS': nOutputs,
+        'WIRING': wire(network, outputs, nInputs),
+        'EXPRESSIONS': expressions,
+    })
+
+def toSource(cls):
+    """ Python source for a synthesized gate class, written out like the gates in gates.py """
+    parts, inPins, connections, outPins = cls.WIRING
+    lines = ["class %s(Gate):" % cls.__name__, '    """']
+    lines.extend("    %s" % e for e in cls.EXPRESSIONS)
+    lines.extend(['    """', "    def __init__(self):",
+                  "        super(%s, self).__init__(%s, %s)" % (cls.__name__, cls.N_INPUTS, cls.N_OUTPUTS)])
+    for attribute, className, args in parts:
+        lines.append("        self.%s = %s(%s)" % (attribute, className, ", ".join(str(a) for a in args)))
+    lines.append("")
+    for i, part, pin in inPins:
+        lines.append("        self.setInPin(%s, self.%s.getInPin(%s))" % (i, part, pin))
+    lines.append("")
+    for source, out, sink, pin in connections:
+        lines.append("        self.%s.getOutPin(%s).addConnection(self.%s.getInPin(%s))" % (source, out, sink, pin))
+    lines.append("")
+    for j, part, pin in outPins:
+        lines.append("        self.setOutPin(%s, self.%s.getOutPin(%s))" % (j, part, pin))
+    if len(inPins) < cls.N_INPUTS:
+        lines.extend(["", "    @overrides(Gate)", "    def refreshOutputs(self):",
+                      "        # an input which no output depends on calls this", "        pass"])
+    return "\n".join(lines) + "\n"
+
+def countGates(gate):
+    """ How many of each primitive gate a gate is built from, by class name """
+    counts = {}
+    seen = set()
+    stack = [gate]
+    while stack:
+        g = stack.pop()
+        if id(g) in seen:
+            continue
+        seen.add(id(g))
+        if isinstance(g, PRIMITIVE_GATES):
+            name = g.__class__.__name__
+            counts[name] = counts.get(name, 0) + 1
+        else:
+            stack.extend(g.subGates())
+    return counts
@@ -0,0 +1,64 @@
+"""
+Run with: python -m unittest discover
+"""
+import shutil
+import tempfile
+import unittest
+
+from gates import Gate, And, FourBitAdder, NBitAdder
+from circuitcache import CircuitCache, classDefinition
+from synthesis import synthesize
+
+class CircuitCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = CircuitCache(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, True)
+
+    def testWarmLoad(self):
+        first = self.cache.simulator(NBitAdder, (8,))
+        second = CircuitCache(self.directory).simulator(NBitAdder, (8,))
+        self.assertEqual(self.cache.misses, 1)
+        vectors = [tuple((v >> i) & 1 for i in xrange(17)) for v in xrange(0, 1 << 17, 997)]
+        self.assertEqual(first.run(vectors), second.run(vectors))
+
+    def testSynthesizedGatesWithTheSameName(self):
+        XorGate = synthesize(lambda a, b: a ^ b, 2, 'X')
+        AndGate = synthesize(lambda a, b: a & b, 2, 'X')
+        self.assertNotEqual(self.cache.key(XorGate), self.cache.key(AndGate))
+        self.assertEqual(self.cache.simulator(XorGate).run([(1, 1)]), [(0,)])
+        self.assertEqual(self.cache.simulator(AndGate).run([(1, 1)]), [(1,)])
+        self.assertEqual(self.cache.misses, 2)
+
+    def testSynthesizedGateNamedLikeItsBase(self):
+        # the default name is the name of the base class, whose source inspect would find
+        OrGate = synthesize(lambda a, b: a | b, 2)
+        NorGate = synthesize(lambda a, b: 1 - (a | b), 2)
+        self.assertEqual(self.cache.simulator(OrGate).run([(0, 0)]), [(0,)])
+        self.assertEqual(self.cache.simulator(NorGate).run([(0, 0)]), [(1,)])
+
+    def testClassWithoutSource(self):
+        def make(gateClass):
+            # two classes built at runtime with the same name
+            class Wrapper(Gate):
+                def __init__(self):
+                    super(Wrapper, self).__init__(2, 1)
+                    self.inner = gateClass()
+                    self.setInPin(0, self.inner.getInPin(0))
+                    self.setInPin(1, self.inner.getInPin(1))
+                    self.setOutPin(0, self.inner.getOutPin(0))
+            return Wrapper
+        AndWrapper = make(And)
+        XorWrapper = make(synthesize(lambda a, b: a ^ b, 2, 'X'))
+        self.assertEqual(classDefinition(AndWrapper), None)
+        self.assertEqual(self.cache.simulator(AndWrapper).run([(1, 1)]), [(1,)])
+        self.assertEqual(self.cache.simulator(XorWrapper).run([(1, 1)]), [(0,)])
+
+    def testDefinitionOfAGateInGatesPy(self):
+        definition = classDefinition(FourBitAdder)
+        self.assertEqual([name for module, name, source in definition], ["FourBitAdder", "Gate"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+"""
+Run with: python -m unittest discover
+"""
+import random
+import unittest
+
+from gates import (GateException, And, DLatch, SRLatch, LatchArray, FourBitAdder, FourToOneMux,
+                   TwoToFourLineDecoder, TwoToOneMux, NBitAdder, MuxTree, MemoizedGate,
+                   WordAnd, WordOr, WordXor, WordNot, WordAdder, WordMux)
+from netlist import flatten, Simulator, NetlistGate
+
+def outputs(gate):
+    return tuple(int(gate.getOutPin(i).value) for i in xrange(gate.nOutputs))
+
+def everyVector(nInputs):
+    return [tuple((row >> i) & 1 for i in xrange(nInputs)) for row in xrange(1 << nInputs)]
+
+def setPins(gate, vector):
+    for i, bit in enumerate(vector):
+        gate.setIn(i, bit)
+
+class BusTest(unittest.TestCase):
+    def testFourBitAdder(self):
+        gate = FourBitAdder()
+        for a in xrange(16):
+            for b in xrange(16):
+                for c in (0, 1):
+                    gate.setWord('A', a)
+                    gate.setWord('B', b)
+                    gate.setWord('C', c)
+                    self.assertEqual(gate.getWord('OUT'), a + b + c, (a, b, c))
+                    self.assertEqual([int(gate.getIn(2 * i)) for i in xrange(4)], [(a >> i) & 1 for i in xrange(4)])
+                    self.assertEqual([int(gate.getIn(2 * i + 1)) for i in xrange(4)], [(b >> i) & 1 for i in xrange(4)])
+                    self.assertEqual(int(gate.getIn(8)), c)
+
+    def testFourToOneMux(self):
+        gate = FourToOneMux()
+        for s in xrange(4):
+            for d in xrange(16):
+                gate.setWord('S', s)
+                gate.setWord('D', d)
+                # S is [1, 0]: In0 is the most significant selector
+                self.assertEqual((int(gate.getIn(0)), int(gate.getIn(1))), (s >> 1, s & 1))
+                self.assertEqual(int(gate.getOutPin(0).value), (d >> s) & 1, (s, d))
+
+    def testMuxTree(self):
+        gate = MuxTree(3)
+        for s in xrange(8):
+            for d in xrange(0, 256, 7):
+                gate.setWord('S', s)
+                gate.setWord('D', d)
+                self.assertEqual([int(gate.getIn(i)) for i in xrange(3)], [(s >> 2) & 1, (s >> 1) & 1, s & 1])
+                self.assertEqual(int(gate.getOutPin(0).value), (d >> s) & 1, (s, d))
+
+    def testTwoToFourLineDecoder(self):
+        gate = TwoToFourLineDecoder()
+        for a in xrange(4):
+            gate.setWord('A', a)
+            self.assertEqual(gate.getWord('OUT'), 1 << a)
+            self.assertEqual(gate.bus('OUT').getBits(), [int(i == a) for i in xrange(4)])
+
+    def testSetInputs(self):
+        gate = FourBitAdder()
+        refreshes = []
+        owners = set(gate.getInPin(i).gate for i in (0, 1, 2))
+        for owner in owners:
+            owner.refreshOutputs = lambda owner=owner, refresh=owner.refreshOutputs: (refreshes.append(owner), refresh())
+        # A = 3 and B = 1: In0, In2 and In1; each gate owning one of them refreshes once
+        gate.setInputs([0, 2, 1], [1, 1, True])
+        self.assertEqual(gate.getWord('OUT'), 4)
+        self.assertEqual(sorted(refreshes), sorted(owners))
+        self.assertRaises(GateException, gate.setInputs, [9], [1])
+
+    def testErrors(self):
+        gate = FourBitAdder()
+        for word in (-1, 16):
+            self.assertRaises(GateException, gate.setWord, 'A', word)
+        self.assertRaises(GateException, gate.setWord, 'C', 2)
+        self.assertRaises(GateException, gate.setWord, 'OUT', 0)
+        self.assertRaises(GateException, gate.setWord, 'X', 0)
+        self.assertRaises(GateException, gate.getWord, 'X')
+
+class WordGateTest(unittest.TestCase):
+    def testWordAdderMatchesNBitAdder(self):
+        for nBits in (1, 2, 3, 4):
+            adder = NBitAdder(nBits)
+            word = WordAdder(nBits)
+            for vector in everyVector(2 * nBits + 1):
+                setPins(adder, vector)
+                setPins(word, vector)
+                self.assertEqual(outputs(word), outputs(adder), (nBits, vector))
+
+    def testWordMuxMatchesTwoToOneMux(self):
+        mux = TwoToOneMux()
+        word = WordMux(1)
+        for vector in everyVector(3):
+            setPins(mux, vector)
+            setPins(word, vector)
+            self.assertEqual(outputs(word), outputs(mux), vector)
+
+    def testWordMux(self):
+        gate = WordMux(4)
+        for s in (0, 1):
+            gate.setWord('S', s)
+            gate.setWord('A', 5)
+            gate.setWord('B', 12)
+            self.assertEqual(gate.getWord('OUT'), 12 if s else 5)
+
+    def testBitwise(self):
+        for cls, op in [(WordAnd, lambda a, b: a & b), (WordOr, lambda a, b: a | b), (WordXor, lambda a, b: a ^ b)]:
+            gate = cls(3)
+            for a in xrange(8):
+                for b in xrange(8):
+                    gate.setWord('A', a)
+                    gate.setWord('B', b)
+                    self.assertEqual(gate.getWord('OUT'), op(a, b), (cls.__name__, a, b))
+        gate = WordNot(3)
+        for a in xrange(8):
+            gate.setWord('A', a)
+            self.assertEqual(gate.getWord('OUT'), 7 - a)
+
+    def testWordGatesCannotBeFlattened(self):
+        for gate in [WordAdder(4), WordMux(2), WordNot(2)]:
+            self.assertRaises(GateException, flatten, gate)
+
+class MemoizedGateTest(unittest.TestCase):
+    def testMatchesSimulator(self):
+        rng = random.Random(0)
+        for make in [FourBitAdder, FourToOneMux, TwoToFourLineDecoder, lambda: NBitAdder(3)]:
+            simulator = Simulator(flatten(make()))
+            for policy in (MemoizedGate.LRU, MemoizedGate.FIFO):
+                for capacity in (1, 2, 4):
+                    gate = MemoizedGate(make(), capacity, policy)
+                    vector = [0] * gate.nInputs
+                    for _ in xrange(300):
+                        i = rng.randrange(gate.nInputs)
+                        vector[i] = rng.randint(0, 1)
+                        gate.setIn(i, vector[i])
+                        self.assertEqual(outputs(gate), simulator.step(tuple(vector)), (gate, policy, capacity))
+                    self.assertTrue(len(gate._cache) <= capacity)
+                    self.assertTrue(gate.hits > 0)
+
+    def testCounters(self):
+        # the inputs (In0 is bit 0) are 1, 3, 2, 3, 1, 3
+        pins = [(0, 1), (1, 1), (0, 0), (0, 1), (1, 0), (1, 1)]
+        for policy, hits, misses, evictions in [(MemoizedGate.LRU, 2, 4, 2), (MemoizedGate.FIFO, 1, 5, 3)]:
+            gate = MemoizedGate(And(), 2, policy)
+            for index, value in pins:
+                gate.setIn(index, value)
+            self.assertEqual(outputs(gate), (1,))
+            self.assertEqual((gate.hits, gate.misses, gate.evictions), (hits, misses, evictions), policy)
+            self.assertEqual(gate.hitRate, hits / 6.0)
+            gate.clearCache()
+            self.assertEqual((gate.hits, gate.misses, gate.evictions, len(gate._cache)), (0, 0, 0, 0))
+
+    def testLatchesAreRefused(self):
+        for gate in [SRLatch(), DLatch(), LatchArray(2), NetlistGate(flatten(DLatch()))]:
+            self.assertRaises(GateException, MemoizedGate, gate)
+        MemoizedGate(NetlistGate(flatten(FourBitAdder())))
+
+    def testArguments(self):
+        self.assertRaises(GateException, MemoizedGate, And(), 0)
+        self.assertRaises(GateException, MemoizedGate, And(), 4, 'random')
+        gate = MemoizedGate(FourBitAdder(), 1, MemoizedGate.FIFO)
+        gate.setWord('A', 5)
+        gate.setWord('B', 6)
+        self.assertEqual(gate.getWord('OUT'), 11)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+"""
+Run with: python -m unittest discover
+"""
+import random
+import unittest
+from StringIO import StringIO
+
+from gates import GateException, FourBitAdder, NBitAdder, FourToOneMux
+from netlist import flatten, Simulator, NetlistGate, LUT
+from lutmap import mapLuts
+from importer import readBlif, readVerilog, writeBlif, writeVerilog
+
+# y = a & c & e | !a & b & !d
+WIDE_BLIF = """
+.model wide
+.inputs a b c d e
+.outputs y
+.names a b c d e y
+1-1-1 1
+01-0- 1
+.end
+"""
+
+def wide(a, b, c, d, e):
+    return int(a and c and e or not a and b and not d)
+
+def everyVector(nInputs):
+    return [tuple((row >> i) & 1 for i in xrange(nInputs)) for row in xrange(1 << nInputs)]
+
+def randomVectors(nInputs, count = 300, seed = 0):
+    rng = random.Random(seed)
+    return [tuple(rng.randint(0, 1) for _ in xrange(nInputs)) for _ in xrange(count)]
+
+class ImporterTest(unittest.TestCase):
+    def assertSameFunction(self, netlist, imported):
+        vectors = randomVectors(netlist.nInputs)
+        self.assertEqual(Simulator(imported).run(vectors), Simulator(netlist).run(vectors))
+
+    def testRoundTrips(self):
+        for gate in [FourBitAdder(), NBitAdder(8), FourToOneMux()]:
+            netlist = flatten(gate)
+            for write, read in [(writeBlif, readBlif), (writeVerilog, readVerilog)]:
+                text = StringIO()
+                write(netlist, text)
+                self.assertSameFunction(netlist, read(StringIO(text.getvalue())))
+            text = StringIO()
+            writeBlif(mapLuts(netlist, 4), text)
+            self.assertSameFunction(netlist, readBlif(StringIO(text.getvalue())))
+
+    def testVerilogLowering(self):
+        netlist = readVerilog(StringIO("""
+            module m(a, b, s, y);
+              input [1:0] a; input b, s;  // a comment
+              output [2:0] y;
+              wire t1, t2; /* a comment over
+              two lines */
+              nand g1(t1, a[0], a[1], b), (t2, s, b);
+              xnor (y[0], t1, t2);
+              assign y[1] = ~a[0] & b & s;
+              assign y[2] = 1'b1;
+            endmodule
+            """))
+        for a0, a1, b, s in everyVector(4):
+            t1 = not (a0 and a1 and b)
+            t2 = not (s and b)
+            self.assertEqual(Simulator(netlist).step((a0, a1, b, s)), (int(t1 == t2), int(not a0 and b and s), 1))
+
+    def testWideCoverBecomesALut(self):
+        netlist = readBlif(StringIO(WIDE_BLIF))
+        self.assertEqual([cell[0] for cell in netlist.cells], [LUT])
+        vectors = everyVector(5)
+        self.assertEqual(Simulator(netlist).run(vectors), [(wide(*v),) for v in vectors])
+
+    def testMapLutsKeepsWideCells(self):
+        netlist = readBlif(StringIO(WIDE_BLIF))
+        vectors = everyVector(5)
+        for k in (2, 3, 4, 5):
+            mapped = mapLuts(netlist, k)
+            self.assertEqual(Simulator(mapped).run(vectors), [(wide(*v),) for v in vectors], k)
+
+    def testMapLutsAroundWideCells(self):
+        # narrow logic on both sides of a wide cover is still mapped
+        netlist = readBlif(StringIO(WIDE_BLIF.replace(".outputs y", ".outputs z").replace(".end", """
+            .names a b p
+            11 1
+            .names p c q
+            1- 1
+            -1 1
+            .names y q z
+            10 1
+            01 1
+            .end""")))
+        mapped = mapLuts(netlist, 4)
+        self.assertTrue(len(mapped.cells) < len(netlist.cells))
+        self.assertSameFunction(netlist, mapped)
+
+    def testWideAndOrCovers(self):
+        names = " ".join("a%s" % i for i in xrange(40))
+        covers = {
+            "1" * 40 + " 1": all,
+            "0" * 40 + " 0": any,
+            "\n".join("-" * i + "1" + "-" * (39 - i) + " 0" for i in xrange(40)): lambda v: not any(v),
+            "\n".join("-" * i + "0" + "-" * (39 - i) + " 1" for i in xrange(40)): lambda v: not all(v),
+        }
+        vectors = randomVectors(40) + [(1,) * 40, (0,) * 40] + [(1,) * i + (0,) + (1,) * (39 - i) for i in xrange(40)]
+        for cover, function in covers.iteritems():
+            netlist = readBlif(StringIO(".model m\n.inputs %s\n.outputs y\n.names %s y\n%s\n.end\n" % (names, names, cover)))
+            self.assertTrue(LUT not in [cell[0] for cell in netlist.cells])
+            self.assertEqual(Simulator(netlist).run(vectors), [(int(function(v)),) for v in vectors])
+        # any other cover that wide is refused before its truth table is built
+        self.assertRaises(GateException, readBlif, StringIO(".model m\n.inputs %s\n.outputs y\n.names %s y\n%s\n.end\n"
+                                                            % (names, names, "1" * 39 + "- 1\n" + "0" * 40 + " 1")))
+
+    def testNetlistGate(self):
+        # a LUT cell feeding a nand, next to an xor
+        netlist = readBlif(StringIO(WIDE_BLIF.replace(".outputs y", ".outputs y z x").replace(".end", """
+            .names y c z
+            0- 1
+            -0 1
+            .names d e x
+            10 1
+            01 1
+            .end""")))
+        gate = NetlistGate(netlist)
+        self.assertEqual(gate.allPins(), [])
+        pin = gate.getOutPin(1)
+        simulator = Simulator(netlist)
+        for vector in randomVectors(netlist.nInputs, 100):
+            for i, bit in enumerate(vector):
+                gate.setIn(i, bit)
+            expected = simulator.step(vector)
+            self.assertEqual(tuple(int(gate.getOut(j)) for j in xrange(gate.nOutputs)), expected)
+            self.assertEqual(int(pin.value), expected[1])
+        # setting an input pin updates the output pins
+        gate.getInPin(2).value = not gate.getIn(2)
+        vector = tuple(int(gate.getIn(i)) for i in xrange(gate.nInputs))
+        self.assertEqual(int(pin.value), simulator.step(vector)[1])
+
+    def testErrors(self):
+        for text in ["module m(a, y); input a; output y; and (y, a, t); and (t, y, a); endmodule",
+                     "module m(a, y); input a; output y; and (y, a, a); or (y, a, a); endmodule",
+                     "module m(a, y); input a; output y; dff (y, a); endmodule"]:
+            self.assertRaises(GateException, readVerilog, StringIO(text))
+        self.assertRaises(GateException, readBlif, StringIO(".model m\n.inputs a\n.outputs y\n.latch a y\n.end\n"))
+
+if __name__ == '__main__':
+    unittest.main()
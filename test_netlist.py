@@ -0,0 +1,174 @@
+"""
+Run with: python -m unittest discover
+"""
+import random
+import unittest
+
+from gates import GateException, DLatch, LatchArray, FourBitAdder
+from netlist import (flatten, Simulator, CompiledSimulator, CompiledCircuit, Circuit, NetlistGate,
+                     LATCH, packVectors, lutSource)
+from lutmap import mapLuts
+from test_parallel import flattenableGates, vectorsFor, raceFree
+
+def pinChanges(netlist, count = 300, seed = 0):
+    """
+    Random single pin changes, as (pin, vector after the change), leaving out any which
+    would set and reset a latch at once
+    """
+    rng = random.Random(seed)
+    latches = [cell for cell in netlist.cells if cell[0] == LATCH]
+    simulator = Simulator(netlist)
+    vector = [0] * netlist.nInputs
+    changes = []
+    for _ in xrange(count):
+        pin = rng.randrange(netlist.nInputs)
+        candidate = list(vector)
+        candidate[pin] = 1 - candidate[pin]
+        state = list(simulator.state)
+        values = simulator.evaluate(packVectors([candidate], netlist.nInputs), 1)
+        if any(values[ins[0]] and values[ins[1]] for kind, ins, outs, aux in latches):
+            simulator.state = state
+            continue
+        vector = candidate
+        changes.append((pin, tuple(vector)))
+    return changes
+
+def outputs(circuit):
+    return tuple(int(circuit.getOut(i)) for i in xrange(circuit.nOutputs))
+
+class CircuitTest(unittest.TestCase):
+    def testEveryGateMatchesSimulator(self):
+        for name, netlist in flattenableGates():
+            for version in (netlist, mapLuts(netlist, 4)):
+                simulator = Simulator(version)
+                circuit = Circuit(version)
+                gate = NetlistGate(version)
+                for pin, vector in pinChanges(version):
+                    circuit.setIn(pin, vector[pin])
+                    gate.setIn(pin, vector[pin])
+                    expected = simulator.step(vector)
+                    self.assertEqual(outputs(circuit), expected, (name, vector))
+                    self.assertEqual(outputs(gate), expected, (name, vector))
+
+    def testForksAreIndependent(self):
+        circuit = Circuit(flatten(DLatch()))
+        circuit.setIn(0, 1)
+        circuit.setIn(1, 1)
+        fork = circuit.fork()
+        self.assertEqual(outputs(fork), (1, 0))
+        circuit.setIn(0, 0)
+        self.assertEqual(outputs(circuit), (0, 1))
+        self.assertEqual(outputs(fork), (1, 0))
+        fork.setIn(1, 0)
+        fork.setIn(0, 0)
+        self.assertEqual(outputs(fork), (1, 0))
+        self.assertEqual(outputs(circuit), (0, 1))
+
+    def testRestore(self):
+        netlist = flatten(LatchArray(3))
+        circuit = Circuit(netlist)
+        simulator = Simulator(netlist)
+        changes = pinChanges(netlist, 100, 1)
+        for pin, vector in changes[:50]:
+            circuit.setIn(pin, vector[pin])
+            simulator.step(vector)
+        snapshot = circuit.snapshot()
+        state = list(simulator.state)
+        before = outputs(circuit)
+        for pin, vector in changes[50:]:
+            circuit.setIn(pin, vector[pin])
+        circuit.restore(snapshot)
+        self.assertEqual(outputs(circuit), before)
+        # and it carries on from the restored latch state
+        simulator.state = state
+        for pin, vector in changes[50:]:
+            circuit.setIn(pin, vector[pin])
+            self.assertEqual(outputs(circuit), simulator.step(vector))
+        self.assertRaises(GateException, circuit.restore, snapshot[:-1])
+
+class GateSnapshotTest(unittest.TestCase):
+    def testRestore(self):
+        latch = DLatch()
+        latch.setIn(0, True)
+        latch.setIn(1, True)
+        latch.setIn(1, False)
+        snapshot = latch.snapshot()
+        latch.setIn(0, False)
+        latch.setIn(1, True)
+        self.assertEqual((latch.getOutPin(0).value, latch.getOutPin(1).value), (False, True))
+        latch.restore(snapshot)
+        self.assertEqual((latch.getOutPin(0).value, latch.getOutPin(1).value), (True, False))
+        # the restored latch holds its value
+        latch.setIn(0, False)
+        self.assertEqual(latch.getOutPin(0).value, True)
+        self.assertEqual(len(snapshot), len(latch.allPins()))
+
+    def testSizeMismatch(self):
+        self.assertRaises(GateException, DLatch().restore, FourBitAdder().snapshot())
+        self.assertRaises(GateException, NetlistGate(flatten(DLatch())).restore, b"\0")
+
+    def testNetlistGate(self):
+        gate = NetlistGate(flatten(DLatch()))
+        pin = gate.getOutPin(0)
+        gate.setIn(0, 1)
+        gate.setIn(1, 1)
+        snapshot = gate.snapshot()
+        gate.setIn(0, 0)
+        self.assertEqual(pin.value, False)
+        gate.restore(snapshot)
+        self.assertEqual((gate.getIn(0), gate.getOut(0), pin.value), (True, True, True))
+
+class CompiledCircuitTest(unittest.TestCase):
+    def testEveryGateMatchesSimulator(self):
+        for name, netlist in flattenableGates():
+            vectors = raceFree(netlist, vectorsFor(netlist))
+            expected = Simulator(netlist).run(vectors)
+            self.assertEqual(CompiledCircuit(netlist).newContext().run(vectors), expected, name)
+            self.assertEqual(CompiledSimulator(netlist).run(vectors), expected, name)
+            context = CompiledCircuit(netlist).newContext()
+            self.assertEqual([context.step(vector) for vector in vectors], expected, name)
+
+    def testCannotBeChanged(self):
+        circuit = CompiledCircuit(flatten(FourBitAdder()))
+        self.assertRaises(GateException, setattr, circuit, '_batchSize', 1)
+        self.assertRaises(GateException, setattr, circuit, 'other', 1)
+
+    def testContextsAreIndependent(self):
+        circuit = CompiledCircuit(flatten(LatchArray(2)))
+        first = circuit.newContext()
+        second = circuit.newContext()
+        # D = 1, E = 1 for latch 0 in the first context only
+        self.assertEqual(first.step((1, 1, 0, 0)), (1, 0))
+        self.assertEqual(second.step((0, 0, 0, 0)), (0, 0))
+        fork = first.fork()
+        self.assertEqual(first.step((0, 0, 1, 1)), (1, 1))
+        self.assertEqual(fork.step((0, 0, 0, 0)), (1, 0))
+        self.assertEqual(second.step((0, 0, 0, 0)), (0, 0))
+        self.assertEqual(circuit.newContext().state, list(circuit.netlist.latchInit))
+
+class LutSourceTest(unittest.TestCase):
+    def testRandomTables(self):
+        rng = random.Random(0)
+        for _ in xrange(1000):
+            k = rng.randint(1, 7)
+            table = rng.getrandbits(1 << k)
+            if rng.random() < 0.3:
+                table &= rng.getrandbits(1 << k)
+            # word i holds input i of every row, so the result is the table itself
+            width = 1 << k
+            names = ["w%s" % i for i in xrange(k)]
+            namespace = dict((name, sum(((row >> i) & 1) << row for row in xrange(width))) for i, name in enumerate(names))
+            namespace['mask'] = (1 << width) - 1
+            for line in lutSource(table, names, 'out'):
+                exec line in namespace
+            self.assertEqual(namespace['out'], table, (k, table))
+
+    def testMappedNetlistsMatchInBatches(self):
+        for name, netlist in flattenableGates():
+            vectors = raceFree(netlist, vectorsFor(netlist))
+            expected = Simulator(netlist).run(vectors)
+            for k in (2, 4, 6):
+                self.assertEqual(CompiledSimulator(mapLuts(netlist, k)).run(vectors), expected, (name, k))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+"""
+Run with: python -m unittest discover
+"""
+import random
+import unittest
+
+import gates
+from gates import Gate, GateException, NBitAdder, MuxTree
+from netlist import flatten, Simulator, LATCH, packVectors
+from parallel import partition, ParallelSimulator
+
+# constructor arguments for the gates which need them
+GATE_ARGS = {'NBitAdder': (8,), 'MuxTree': (3,), 'LatchArray': (3,)}
+
+def flattenableGates():
+    """ (name, netlist) for every gate in gates.py which can be flattened """
+    netlists = []
+    for name in sorted(dir(gates)):
+        cls = getattr(gates, name)
+        if not (isinstance(cls, type) and issubclass(cls, Gate)) or cls is Gate:
+            continue
+        try:
+            netlists.append((name, flatten(cls(*GATE_ARGS.get(name, ())))))
+        except (TypeError, GateException):
+            # abstract, word-level or wrapper gates
+            pass
+    return netlists
+
+def vectorsFor(netlist, count = 200, seed = 0):
+    """ Every input vector if there are few, otherwise random ones; in a random order for latches """
+    rng = random.Random(seed)
+    if netlist.nInputs <= 6:
+        rows = [tuple((row >> i) & 1 for i in xrange(netlist.nInputs)) for row in xrange(1 << netlist.nInputs)]
+        return rows + [rng.choice(rows) for _ in xrange(count)]
+    return [tuple(rng.randint(0, 1) for _ in xrange(netlist.nInputs)) for _ in xrange(count)]
+
+def raceFree(netlist, vectors):
+    """ The vectors, leaving out any which would set and reset a latch at once (its value is then random) """
+    latches = [cell for cell in netlist.cells if cell[0] == LATCH]
+    if not latches:
+        return vectors
+    simulator = Simulator(netlist)
+    kept = []
+    for vector in vectors:
+        state = list(simulator.state)
+        values = simulator.evaluate(packVectors([vector], netlist.nInputs), 1)
+        if any(values[ins[0]] and values[ins[1]] for kind, ins, outs, aux in latches):
+            simulator.state = state
+        else:
+            kept.append(vector)
+    return kept
+
+class ParallelSimulatorTest(unittest.TestCase):
+    def testEveryGateMatchesSimulator(self):
+        netlists = flattenableGates()
+        self.assertTrue(len(netlists) > 20)
+        for name, netlist in netlists:
+            vectors = raceFree(netlist, vectorsFor(netlist))
+            expected = Simulator(netlist).run(vectors)
+            for nProcesses in (1, 2, 3):
+                with ParallelSimulator(netlist, nProcesses) as simulator:
+                    self.assertEqual(simulator.run(vectors), expected, "%s with %s processes" % (name, nProcesses))
+
+class PartitionTest(unittest.TestCase):
+    def testMuxTreeSplitsIntoSubtrees(self):
+        partitioning = partition(flatten(MuxTree(7)), 2)
+        self.assertTrue(partitioning.cutNets <= 8, partitioning)
+        self.assertTrue(min(partitioning.sizes) * 3 > max(partitioning.sizes) * 2, partitioning)
+
+    def testAdderSplitsIntoRangesOfBits(self):
+        partitioning = partition(flatten(NBitAdder(32)), 4)
+        self.assertTrue(partitioning.cutNets <= 4, partitioning)
+        self.assertEqual(partitioning.sizes, [40, 40, 40, 40])
+
+    def testEveryCellHasAPart(self):
+        for name, netlist in flattenableGates():
+            partitioning = partition(netlist, 3)
+            self.assertEqual(sum(partitioning.sizes), len(netlist.cells), name)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+"""
+Run with: python -m unittest discover
+"""
+import unittest
+
+from gates import GateException, DLatch, SRLatch, LatchArray
+from netlist import flatten, Simulator
+from reach import TABLE_LATCHES, explore, packState
+
+class ExploreTest(unittest.TestCase):
+    def assertTracesReach(self, space):
+        netlist = space.netlist
+        for layer in space.layers:
+            for target in layer:
+                path = space.trace(target)
+                simulator = Simulator(netlist)
+                simulator.run(path)
+                self.assertEqual(packState(simulator.state), target, (netlist.name, target, path))
+                self.assertEqual(len(path), [target in layer for layer in space.layers].index(True))
+
+    def testEveryStateIsReached(self):
+        for gate, nStates, depth in [(SRLatch(), 2, 1), (DLatch(), 2, 1), (LatchArray(3), 8, 1), (LatchArray(6), 64, 1)]:
+            space = explore(flatten(gate))
+            self.assertEqual((space.nStates, space.depth, space.complete), (nStates, depth, True), gate)
+            self.assertEqual(sorted(state for layer in space.layers for state in layer), range(nStates))
+            self.assertTracesReach(space)
+
+    def testOneLatchAtATime(self):
+        alphabet = [tuple(int(j == 2 * i or j == 2 * i + 1) for j in xrange(8)) for i in xrange(4)]
+        space = explore(flatten(LatchArray(4)), alphabet)
+        self.assertEqual((space.nStates, space.depth), (16, 4))
+        self.assertEqual([len(layer) for layer in space.layers], [1, 4, 6, 4, 1])
+        self.assertTracesReach(space)
+
+    def testMaxStates(self):
+        netlist = flatten(LatchArray(3))
+        for maxStates, nStates, complete in [(1, 1, False), (5, 5, False), (8, 8, True), (100, 8, True)]:
+            space = explore(netlist, maxStates = maxStates)
+            self.assertEqual((space.nStates, space.complete), (nStates, complete), maxStates)
+            found = [state for state in xrange(8) if state in space]
+            self.assertEqual(len(found), nStates)
+            self.assertTracesReach(space)
+            for state in set(xrange(8)) - set(found):
+                self.assertRaises(GateException, space.trace, state)
+
+    def testManyLatches(self):
+        # more latches than the table allows, with an alphabet which sets one latch at a time
+        n = TABLE_LATCHES + 2
+        alphabet = [tuple(int(j == 2 * i or j == 2 * i + 1) for j in xrange(2 * n)) for i in xrange(n)]
+        space = explore(flatten(LatchArray(n)), alphabet, maxStates = 500)
+        self.assertEqual((space.nStates, space.complete), (500, False))
+        self.assertEqual(sorted(space.layers[1]), [1 << i for i in xrange(n)])
+        self.assertTrue(1 << n not in space)
+        self.assertTracesReach(space)
+
+if __name__ == '__main__':
+    unittest.main()
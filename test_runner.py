@@ -0,0 +1,125 @@
+"""
+Run with: python -m unittest discover
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+from StringIO import StringIO
+
+from gates import FourBitAdder, NBitAdder
+from netlist import flatten, Simulator
+import runner
+
+def randomRows(nBits, count, seed = 0):
+    rng = random.Random(seed)
+    return [''.join(rng.choice('01') for _ in xrange(nBits)) for _ in xrange(count)]
+
+def expectedRows(gate, rows):
+    results = Simulator(flatten(gate)).run([tuple(int(bit) for bit in row) for row in rows])
+    return [''.join(str(bit) for bit in result) for result in results]
+
+class RunnerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, True)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def main(self, *argv):
+        """ Run the runner, returning its exit code and what it printed """
+        stdout, stderr = sys.stdout, sys.stderr
+        sys.stdout = sys.stderr = printed = StringIO()
+        try:
+            return runner.main(list(argv)), printed.getvalue()
+        finally:
+            sys.stdout, sys.stderr = stdout, stderr
+
+    def writeVectors(self, name, nBits, rows):
+        vectors = runner.FORMATS[runner.BINARY if name.endswith('.bin') else runner.TEXT](self.path(name), nBits, write=True)
+        vectors.write(rows)
+        vectors.close()
+
+    def readVectors(self, name, nBits):
+        vectors = runner.FORMATS[runner.BINARY if name.endswith('.bin') else runner.TEXT](self.path(name), nBits)
+        rows = vectors.read(1 << 20)
+        vectors.close()
+        return rows
+
+    def testText(self):
+        rows = randomRows(9, 1000)
+        self.writeVectors('in.txt', 9, rows)
+        code, printed = self.main('FourBitAdder', self.path('in.txt'), self.path('out.txt'), '--chunk', '300')
+        self.assertEqual(code, 0, printed)
+        self.assertEqual(self.readVectors('out.txt', 5), expectedRows(FourBitAdder(), rows))
+        self.assertTrue(printed.startswith("1000 vectors"), printed)
+
+    def testBinary(self):
+        # 11 inputs and 6 outputs, so the records are padded
+        rows = randomRows(11, 1000)
+        self.writeVectors('in.bin', 11, rows)
+        code, printed = self.main('NBitAdder', '--arg', '5', self.path('in.bin'), self.path('out.bin'))
+        self.assertEqual(code, 0, printed)
+        self.assertEqual(os.path.getsize(self.path('out.bin')), 1000)
+        self.assertEqual(self.readVectors('out.bin', 6), expectedRows(NBitAdder(5), rows))
+
+    def testGateObjectsAndCache(self):
+        # a WordAdder can't be flattened, so it runs on the Gate objects
+        rows = randomRows(7, 200)
+        self.writeVectors('in.txt', 7, rows)
+        expected = expectedRows(NBitAdder(3), rows)
+        for extra in [(), ('--cache', self.path('cache')), ('--lut', '4', '--cache', self.path('cache'))]:
+            for name in ('WordAdder', 'NBitAdder'):
+                code, printed = self.main(name, '--arg', '3', self.path('in.txt'), self.path('out.txt'), *extra)
+                self.assertEqual(code, 0, printed)
+                self.assertEqual(self.readVectors('out.txt', 4), expected, (name, extra))
+
+    def testExpected(self):
+        for suffix in ('.txt', '.bin'):
+            rows = randomRows(9, 100)
+            results = expectedRows(FourBitAdder(), rows)
+            self.writeVectors('in' + suffix, 9, rows)
+            self.writeVectors('good' + suffix, 5, results)
+            code, printed = self.main('FourBitAdder', self.path('in' + suffix), self.path('out' + suffix),
+                                      '--expected', self.path('good' + suffix))
+            self.assertEqual(code, 0, printed)
+            self.assertTrue("0 mismatches" in printed, printed)
+            wrong = list(results)
+            wrong[7] = ('1' if wrong[7][0] == '0' else '0') + wrong[7][1:]
+            self.writeVectors('bad' + suffix, 5, wrong)
+            code, printed = self.main('FourBitAdder', self.path('in' + suffix), self.path('out' + suffix),
+                                      '--expected', self.path('bad' + suffix))
+            self.assertEqual(code, 1, printed)
+            self.assertTrue("1 mismatches" in printed and "vector 7:" in printed, printed)
+            # an expected-results file of the wrong length is an error
+            self.writeVectors('short' + suffix, 5, results[:-1])
+            code, printed = self.main('FourBitAdder', self.path('in' + suffix), self.path('out' + suffix),
+                                      '--expected', self.path('short' + suffix))
+            self.assertEqual(code, 2, printed)
+
+    def testErrors(self):
+        with open(self.path('bad.txt'), 'w') as stream:
+            stream.write("000000000\n00000000\n")
+        code, printed = self.main('FourBitAdder', self.path('bad.txt'), self.path('out.txt'))
+        self.assertEqual(code, 2)
+        self.assertTrue("Line 2" in printed, printed)
+        with open(self.path('odd.bin'), 'wb') as stream:
+            stream.write("\0\0\0")
+        self.assertEqual(self.main('FourBitAdder', self.path('odd.bin'), self.path('out.bin'))[0], 2)
+
+        self.writeVectors('in.txt', 9, randomRows(9, 10))
+        for argv in [('NoSuchGate',), ('GateException',), ('NBitAdder',), ('NBitAdder', '--arg', '1', '--arg', '2')]:
+            for cache in [(), ('--cache', self.path('cache'))]:
+                args = argv + (self.path('in.txt'), self.path('out.txt')) + cache
+                code, printed = self.main(*args)
+                self.assertEqual(code, 2, args)
+                self.assertTrue(printed.startswith("error:"), printed)
+        self.assertEqual(self.main('FourBitAdder', self.path('missing.txt'), self.path('out.txt'))[0], 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+"""
+Run with: python -m unittest discover
+"""
+import random
+import unittest
+
+import gates
+from gates import GateException
+from netlist import flatten, Simulator
+from synthesis import synthesize, toSource, countGates
+
+def everyVector(nInputs):
+    return [tuple((row >> i) & 1 for i in xrange(nInputs)) for row in xrange(1 << nInputs)]
+
+def randomTable(rng, nInputs, nOutputs):
+    """ A random truth table with don't-cares, in which some outputs are constants or copy an input """
+    columns = []
+    for j in xrange(nOutputs):
+        shape = rng.randrange(6)
+        if shape == 0:
+            value = rng.randint(0, 1)
+            columns.append([value] * (1 << nInputs))
+        elif shape == 1:
+            i = rng.randrange(nInputs)
+            columns.append([(row >> i) & 1 for row in xrange(1 << nInputs)])
+        else:
+            columns.append([rng.choice((0, 1, None)) for row in xrange(1 << nInputs)])
+    return [tuple(column[row] for column in columns) for row in xrange(1 << nInputs)]
+
+class SynthesisTest(unittest.TestCase):
+    def assertImplements(self, cls, table, nInputs):
+        outputs = Simulator(flatten(cls())).run(everyVector(nInputs))
+        for row, (expected, actual) in enumerate(zip(table, outputs)):
+            for value, output in zip(expected, actual):
+                if value is not None:
+                    self.assertEqual(output, value, (cls.__name__, table, row))
+
+    def testRandomTables(self):
+        rng = random.Random(0)
+        for _ in xrange(150):
+            nInputs = rng.randint(1, 5)
+            table = randomTable(rng, nInputs, rng.randint(1, 3))
+            self.assertImplements(synthesize(table, nInputs), table, nInputs)
+
+    def testGateLevel(self):
+        # the synthesized gate itself, not only its netlist, computes the function
+        Decoder = synthesize(lambda a0, a1: [a0 + 2 * a1 == k for k in range(4)], 2, 'Decoder')
+        gate = Decoder()
+        for a0, a1 in everyVector(2):
+            gate.setIn(0, a0)
+            gate.setIn(1, a1)
+            self.assertEqual([int(gate.getOutPin(k).value) for k in xrange(4)], [int(a0 + 2 * a1 == k) for k in xrange(4)])
+        self.assertEqual(countGates(gate).get('Not'), 2)
+
+    def testToSource(self):
+        rng = random.Random(1)
+        for n in xrange(40):
+            nInputs = rng.randint(1, 4)
+            table = randomTable(rng, nInputs, rng.randint(1, 3))
+            cls = synthesize(table, nInputs, 'Synthesized%s' % n)
+            namespace = dict(vars(gates))
+            exec toSource(cls) in namespace
+            written = namespace['Synthesized%s' % n]
+            self.assertEqual(written.__bases__, (gates.Gate,))
+            self.assertImplements(written, table, nInputs)
+            self.assertEqual(countGates(written()), countGates(cls()))
+
+    def testErrors(self):
+        self.assertRaises(GateException, synthesize, [(0,)], 0)
+        self.assertRaises(GateException, synthesize, [(0,), (1,)], 2)
+        self.assertRaises(GateException, synthesize, [(0,), (1, 0)], 1)
+
+if __name__ == '__main__':
+    unittest.main()